@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
+import copy
 import os.path
 from datetime import timedelta
 from pathlib import Path
@@ -57,7 +58,8 @@ INSTALLED_APPS = [
     'content',
     "news",
     "seller",
-    "analytics"
+    "analytics",
+    "idempotency",
 ]
 
 MIDDLEWARE = [
@@ -107,8 +109,10 @@ try:
     # импорт в try-catch для совместимости с другими БД
     from django.db.backends.postgresql.psycopg_any import IsolationLevel
 
-    __serializeable_db = DATABASES["default"]
+    # копия, чтобы уровень изоляции не применился к default
+    __serializeable_db = copy.deepcopy(DATABASES["default"])
     __serializeable_db.setdefault("OPTIONS", {})
+    __serializeable_db.setdefault("TEST", {})["MIRROR"] = "default"
     __serializeable_db["OPTIONS"]["isolation_level"] = IsolationLevel.SERIALIZABLE
     DATABASES["serializeable"] = __serializeable_db
 except ImportError:
@@ -189,6 +193,15 @@ REST_KNOX = {
     'AUTH_COOKIE_KEY': 'AuthToken',
 }
 
+# время, на которое проверенный токен кэшируется в памяти процесса (см. users.auth.TokenAuthCache); 0 - без кэша
+AUTH_TOKEN_CACHE_TTL = timedelta(seconds=env.int("AUTH_TOKEN_CACHE_TTL", default=15))
+
+# интервал записи в лог счетчиков конфликтов сериализации (см. utils.transactions.RetryMetrics) в секундах; 0 - не записывать
+RETRY_METRICS_LOG_INTERVAL = env.int("RETRY_METRICS_LOG_INTERVAL", default=60)
+
+# максимальное количество токенов пользователя, при входе сверх лимита удаляются самые старые (см. users.services.AuthTokenService)
+AUTH_TOKEN_LIMIT_PER_USER = env.int("AUTH_TOKEN_LIMIT_PER_USER", default=10)
+
 AUTH_USER_MODEL = "users.User"
 
 AUTHENTICATION_BACKENDS = [
@@ -236,10 +249,41 @@ STORAGES = {
 }
 WHITENOISE_MAX_AGE = 86400
 
+# импорт товаров: файлы товаров (ProductBulkCreator.MAX_PRODUCTS) и манифест
+DATA_UPLOAD_MAX_NUMBER_FILES = 101
+
+# отдача файлов товаров через прокси: "" - через Django, "nginx" - X-Accel-Redirect, "sendfile" - X-Sendfile (Apache, lighttpd)
+FILE_DOWNLOAD_OFFLOAD = env.str("FILE_DOWNLOAD_OFFLOAD", default="")
+# internal location прокси, отдающий файлы из MEDIA_ROOT (см. nginx/nginx.local.conf)
+FILE_DOWNLOAD_ACCEL_PREFIX = env.str("FILE_DOWNLOAD_ACCEL_PREFIX", default="/protected-media/")
+
 PRODUCT_FILE_MAX_AGE = timedelta(seconds=env.int("PRODUCT_FILE_MAX_AGE"))
 
+# время хранения ответов на запросы с заголовком Idempotency-Key
+IDEMPOTENCY_KEY_TTL = timedelta(seconds=env.int("IDEMPOTENCY_KEY_TTL", default=24 * 60 * 60))
+
+# время, на которое товар закрепляется за покупателем перед покупкой
+PRODUCT_RESERVATION_TTL = timedelta(seconds=env.int("PRODUCT_RESERVATION_TTL", default=120))
+
+# интервалы периодических задач (run_scheduler) в секундах. Задачи без значения используют интервал из jobs.py
+SCHEDULER_INTERVALS = {
+    "prune_files": env.int("PRUNE_FILES_INTERVAL", default=3600),
+    "flush_purchase_log": env.int("FLUSH_PURCHASE_LOG_INTERVAL", default=10),
+    "release_expired_reservations": env.int("RELEASE_RESERVATIONS_INTERVAL", default=15),
+    "purge_idempotency_records": env.int("PURGE_IDEMPOTENCY_RECORDS_INTERVAL", default=3600),
+    "process_ipn_events": env.int("PROCESS_IPN_EVENTS_INTERVAL", default=2),
+    "reconcile_payments": env.int("RECONCILE_PAYMENTS_INTERVAL", default=600),
+    "take_balance_snapshots": env.int("TAKE_BALANCE_SNAPSHOTS_INTERVAL", default=300),
+    "purge_expired_auth_tokens": env.int("PURGE_EXPIRED_AUTH_TOKENS_INTERVAL", default=3600),
+}
+
 PAYMENT_SERVICE_API_KEY = env.str("PAYMENT_SERVICE_API_KEY")
 PAYMENT_SERVICE_IPN_KEY = env.str("PAYMENT_SERVICE_IPN_KEY")
 PAYMENT_MIN_AMOUNT = env.float("PAYMENT_MIN_AMOUNT")
+# для локальных тестов можно указать адрес fake_nowpayments, например http://localhost:8089/v1/
+PAYMENT_SERVICE_API_URL = env.str("PAYMENT_SERVICE_API_URL", default="https://api.nowpayments.io/v1/")
+PAYMENT_SERVICE_CONNECT_TIMEOUT = env.float("PAYMENT_SERVICE_CONNECT_TIMEOUT", default=3.05)
+PAYMENT_SERVICE_READ_TIMEOUT = env.float("PAYMENT_SERVICE_READ_TIMEOUT", default=10)
+PAYMENT_SERVICE_POOL_SIZE = env.int("PAYMENT_SERVICE_POOL_SIZE", default=10)
 HOSTNAME = env.str("DOMAIN_NAME")
 GOOGLE_TABLE_ID = env.str("GOOGLE_TABLE_ID")
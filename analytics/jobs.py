@@ -0,0 +1,7 @@
+from utils.scheduler import periodic
+from .services import PurchaseLogOutbox
+
+
+@periodic("flush_purchase_log", interval=10)
+def flush_purchase_log():
+    PurchaseLogOutbox.flush_all()
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from analytics.services import PurchaseLogOutbox
+
+
+class Command(BaseCommand):
+    help = "Отправляет накопленные покупки из outbox в Google Sheets. Периодически выполняется планировщиком (run_scheduler)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=PurchaseLogOutbox.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        sent = PurchaseLogOutbox.flush_all(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Successfully flushed {sent} purchase log records"))
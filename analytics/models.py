@@ -0,0 +1,29 @@
+from django.db import models
+from django.utils import timezone
+
+
+class PurchaseLogRecord(models.Model):
+    """
+    Outbox для записи покупок в Google Sheets.
+    Запись создается в транзакции покупки, отправляется в таблицу фоновой командой flush_purchase_log и удаляется после отправки
+    """
+    id = models.BigAutoField(primary_key=True)
+    row = models.JSONField()
+    """
+    Готовая строка для добавления в таблицу
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["next_attempt_at", "id"]),    # для выборки записей, готовых к отправке
+        ]
+
+    def __str__(self):
+        return f"Purchase log record {self.id}"
+
+    def __repr__(self):
+        return self.__str__()
@@ -1,10 +1,18 @@
+import logging
+import random
+from datetime import timedelta
 import gspread.utils
 from gspread import Client, service_account, Spreadsheet, Worksheet
-from typing import Self
+from typing import Self, List
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 
 from products.models import Product
 from seller.services import SellerEconomyService
+from .models import PurchaseLogRecord
+
+logger = logging.getLogger(__name__)
 
 
 class GoogleSheetsWriter:
@@ -22,8 +30,10 @@ class GoogleSheetsWriter:
     # примитивный Singleton
     def __new__(cls, *args, **kwargs):
         if cls.__instance is None:
-            cls.__instance = object.__new__(cls)
-            cls.__instance.__initialize()
+            instance = object.__new__(cls)
+            # объект сохраняется только после успешной инициализации, иначе при ошибке сети синглтон останется нерабочим
+            instance.__initialize()
+            cls.__instance = instance
         return cls.__instance
 
     def __initialize(self):
@@ -49,7 +59,11 @@ class GoogleSheetsWriter:
         sheet.freeze(1)
         return sheet
 
-    def log_purchase(self, product: Product):
+    @staticmethod
+    def build_purchase_row(product: Product) -> list:
+        """
+        Формирует строку таблицы для купленного товара. Не требует подключения к Google Sheets
+        """
         # чтобы избежать циклического импорта
         from products.services import ProductFileManager
 
@@ -62,8 +76,98 @@ class GoogleSheetsWriter:
         added = product.added_at.strftime("%Y-%m-%d %H:%M:%S")
         purchased = product.purchased_at.strftime("%Y-%m-%d %H:%M:%S")
 
-        self.__sheet.append_row([product.seller.username, added, filename, product.category.name,
-                                product.score, product.number, " ", earn, float(product.price),
-                                product.purchased_by.username, purchased],
-                                value_input_option=gspread.utils.ValueInputOption.user_entered,
-                                table_range="A1")
+        return [product.seller.username, added, filename, product.category.name,
+                product.score, product.number, " ", earn, float(product.price),
+                product.purchased_by.username, purchased]
+
+    def log_purchase(self, product: Product):
+        self.append_rows([self.build_purchase_row(product)])
+
+    def append_rows(self, rows: List[list]):
+        """
+        Добавляет строки в таблицу одним запросом
+        """
+        self.__sheet.append_rows(rows,
+                                 value_input_option=gspread.utils.ValueInputOption.user_entered,
+                                 table_range="A1")
+
+
+class PurchaseLogOutbox:
+    """
+    Запись покупок в Google Sheets через outbox (PurchaseLogRecord).
+    add() вызывается внутри транзакции покупки и не обращается к Google, flush() отправляет накопленные строки пачками
+    """
+    BATCH_SIZE = 100
+    RETRY_BASE_DELAY = timedelta(seconds=5)
+    RETRY_MAX_DELAY = timedelta(minutes=10)
+
+    @staticmethod
+    def add(product: Product, using: str = "default") -> PurchaseLogRecord:
+        """
+        :param using: БД, в транзакции которой выполняется покупка. Запись должна попасть в ту же транзакцию
+        """
+        return PurchaseLogRecord.objects.using(using).create(row=GoogleSheetsWriter.build_purchase_row(product))
+
+    @staticmethod
+    def add_many(products: List[Product], using: str = "default") -> List[PurchaseLogRecord]:
+        """
+        Добавляет строки нескольких покупок одним INSERT
+        """
+        return PurchaseLogRecord.objects.using(using).bulk_create(
+            PurchaseLogRecord(row=GoogleSheetsWriter.build_purchase_row(product)) for product in products
+        )
+
+    @classmethod
+    def flush(cls, batch_size: int = BATCH_SIZE) -> int:
+        """
+        Отправляет одну пачку записей, у которых наступило время отправки.
+        Записи блокируются с SKIP LOCKED, поэтому несколько процессов могут вызывать flush одновременно
+        :return: Количество отправленных записей
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            records = list(PurchaseLogRecord.objects
+                           .select_for_update(skip_locked=True)
+                           .filter(next_attempt_at__lte=now)
+                           .order_by("id")[:batch_size])
+            if not records:
+                return 0
+
+            try:
+                GoogleSheetsWriter().append_rows([record.row for record in records])
+            except Exception as e:
+                logger.exception("Failed to append %s purchase rows to Google Sheets", len(records))
+                cls.__postpone(records, e)
+                return 0
+
+            PurchaseLogRecord.objects.filter(id__in=[record.id for record in records]).delete()
+
+        logger.info("Appended %s purchase rows to Google Sheets", len(records))
+        return len(records)
+
+    @classmethod
+    def flush_all(cls, batch_size: int = BATCH_SIZE) -> int:
+        """
+        Отправляет пачки, пока есть готовые к отправке записи или пока отправка не завершится ошибкой
+        """
+        total = 0
+        while sent := cls.flush(batch_size):
+            total += sent
+        return total
+
+    @classmethod
+    def get_retry_delay(cls, attempts: int) -> timedelta:
+        """
+        Экспоненциальная задержка со случайным разбросом (jitter), ограниченная RETRY_MAX_DELAY
+        """
+        delay = min(cls.RETRY_BASE_DELAY * (2 ** min(attempts - 1, 16)), cls.RETRY_MAX_DELAY)
+        return delay * random.uniform(0.5, 1)
+
+    @classmethod
+    def __postpone(cls, records: List[PurchaseLogRecord], error: Exception):
+        now = timezone.now()
+        for record in records:
+            record.attempts += 1
+            record.next_attempt_at = now + cls.get_retry_delay(record.attempts)
+            record.last_error = repr(error)
+        PurchaseLogRecord.objects.bulk_update(records, ["attempts", "next_attempt_at", "last_error"])
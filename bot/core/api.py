@@ -75,7 +75,7 @@ class APIClient:
         response = await self.client.get(self.base_url + f"products/?support_code={support_code}")
         self.raise_auth_errors(response)
 
-        result = response.json()
+        result = response.json()["results"]
         if not any(result):
             return None
 
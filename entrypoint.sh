@@ -1,8 +1,9 @@
 #!/bin/sh
 
-service cron start
-
-python3 manage.py prune_files
+# периодические задачи: удаление устаревших файлов, отправка покупок в Google Sheets
+python3 manage.py run_scheduler --exclude-job process_ipn_events &
+# обработка IPN в отдельном процессе, чтобы долгие задачи (сверка платежей, очистка файлов) не задерживали зачисление
+python3 manage.py run_scheduler --job process_ipn_events &
 
 exec "$@"
 
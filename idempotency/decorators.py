@@ -0,0 +1,63 @@
+import functools
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from utils.exceptions import APIException
+from .services import IdempotencyService
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def idempotent(transient_codes: tuple[str, ...] = ()):
+    """
+    Декоратор для методов APIView и action ViewSet.
+    Если запрос содержит заголовок Idempotency-Key, результат сохраняется, и повторные запросы с тем же ключом
+    получают сохраненный ответ без повторного выполнения метода.
+    Ответы 5xx и ошибки с кодом из transient_codes не сохраняются, такой запрос можно повторить с тем же ключом
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if key is None:
+                return func(view, request, *args, **kwargs)
+
+            try:
+                service = IdempotencyService(request.user, key,
+                                             IdempotencyService.get_fingerprint(request.method, request.path, request.data))
+                record = service.begin()
+            except IdempotencyService.InvalidKeyError:
+                raise ValidationError({"idempotency_key": "Invalid idempotency key"}, code="invalid_idempotency_key")
+            except IdempotencyService.KeyReusedError:
+                raise APIException("Idempotency key was already used for another request", code="idempotency_key_reused", status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            except IdempotencyService.InProgressError:
+                raise APIException("Request with this idempotency key is in progress", code="idempotency_key_in_progress", status=status.HTTP_409_CONFLICT)
+
+            if record is not None:
+                return Response(record.response_data, status=record.status_code, headers={REPLAYED_HEADER: "true"})
+
+            try:
+                try:
+                    response = func(view, request, *args, **kwargs)
+                except Exception as e:
+                    if _is_transient(e, transient_codes):
+                        raise
+                    # ответ с ошибкой сохраняется так же, как успешный
+                    response = view.handle_exception(e)
+            except BaseException:
+                service.abort()
+                raise
+
+            if response.status_code >= 500:
+                service.abort()
+            else:
+                service.complete(response.status_code, response.data)
+            return response
+        return wrapper
+    return decorator
+
+
+def _is_transient(error: Exception, transient_codes: tuple[str, ...]) -> bool:
+    codes = getattr(error, "get_codes", lambda: None)()
+    return isinstance(codes, str) and codes in transient_codes
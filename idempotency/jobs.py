@@ -0,0 +1,7 @@
+from utils.scheduler import periodic
+from .services import IdempotencyService
+
+
+@periodic("purge_idempotency_records", interval=3600)
+def purge_idempotency_records():
+    IdempotencyService.purge_expired()
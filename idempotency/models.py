@@ -0,0 +1,34 @@
+from django.db import models
+from users.models import User
+
+
+class IdempotencyRecord(models.Model):
+    """
+    Результат запроса с заголовком Idempotency-Key. Повторный запрос с тем же ключом получает сохраненный ответ,
+    не выполняя действие заново. Записи удаляются после expires_at задачей purge_idempotency_records
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_records')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    """
+    Хеш метода, пути и тела запроса. Ключ нельзя использовать для другого запроса
+    """
+    status_code = models.PositiveSmallIntegerField(null=True, default=None)
+    """
+    None - запрос еще выполняется
+    """
+    response_data = models.JSONField(null=True, default=None)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="idempotency_user_key_unique"),
+        ]
+
+    def __str__(self):
+        return f"Idempotency record {self.key}"
+
+    def __repr__(self):
+        return self.__str__()
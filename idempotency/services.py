@@ -0,0 +1,97 @@
+import hashlib
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+from users.models import User
+from .models import IdempotencyRecord
+
+
+class IdempotencyService:
+    """
+    Хранение результатов запросов по ключу идемпотентности.
+    begin() создает запись до выполнения действия, поэтому параллельный повтор запроса не выполняет действие второй раз
+    """
+    MAX_KEY_LENGTH = 255
+    IN_PROGRESS_TIMEOUT = timedelta(minutes=1)
+    """
+    Время, после которого незавершенная запись (процесс завершился во время запроса) считается брошенной
+    """
+
+    class InvalidKeyError(Exception):
+        pass
+
+    class KeyReusedError(Exception):
+        """
+        Ключ уже использован для запроса с другими параметрами
+        """
+        pass
+
+    class InProgressError(Exception):
+        """
+        Запрос с этим ключом еще выполняется
+        """
+        pass
+
+    user: User
+    key: str
+    fingerprint: str
+
+    def __init__(self, user: User, key: str, fingerprint: str):
+        if not key or len(key) > self.MAX_KEY_LENGTH:
+            raise self.InvalidKeyError
+
+        self.user = user
+        self.key = key
+        self.fingerprint = fingerprint
+
+    @staticmethod
+    def get_fingerprint(method: str, path: str, data) -> str:
+        body = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha256(f"{method}\n{path}\n{body}".encode()).hexdigest()
+
+    def begin(self) -> IdempotencyRecord | None:
+        """
+        :return: Завершенная запись, если запрос уже выполнялся, иначе None (запрос нужно выполнить и вызвать complete)
+        """
+        now = timezone.now()
+        for _ in range(2):
+            try:
+                with transaction.atomic():
+                    IdempotencyRecord.objects.create(user=self.user, key=self.key, fingerprint=self.fingerprint,
+                                                     expires_at=now + settings.IDEMPOTENCY_KEY_TTL)
+                return None
+            except IntegrityError:
+                pass
+
+            record = IdempotencyRecord.objects.filter(user=self.user, key=self.key).first()
+            # запись удалена между INSERT и SELECT
+            if record is None:
+                continue
+
+            if record.expires_at <= now or (record.status_code is None and record.created_at <= now - self.IN_PROGRESS_TIMEOUT):
+                IdempotencyRecord.objects.filter(id=record.id).delete()
+                continue
+
+            if record.fingerprint != self.fingerprint:
+                raise self.KeyReusedError
+            if record.status_code is None:
+                raise self.InProgressError
+            return record
+
+        raise self.InProgressError
+
+    def complete(self, status_code: int, data):
+        IdempotencyRecord.objects.filter(user=self.user, key=self.key).update(status_code=status_code,
+                                                                              response_data=data)
+
+    def abort(self):
+        """
+        Удаляет запись, чтобы запрос можно было повторить с тем же ключом
+        """
+        IdempotencyRecord.objects.filter(user=self.user, key=self.key, status_code=None).delete()
+
+    @staticmethod
+    def purge_expired() -> int:
+        return IdempotencyRecord.objects.filter(expires_at__lte=timezone.now()).delete()[0]
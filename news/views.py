@@ -1,4 +1,4 @@
-from django.http import FileResponse
+import mimetypes
 from rest_framework.decorators import action
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.permissions import IsAuthenticated
@@ -6,6 +6,7 @@ from rest_framework import status
 from .models import Article
 from .serializers import ArticleSerializer
 from utils.exceptions import APIException
+from utils.file_responses import serve_file
 
 
 class NewsViewSet(ReadOnlyModelViewSet):
@@ -33,11 +34,9 @@ class NewsViewSet(ReadOnlyModelViewSet):
         if not article.image or not article.image.storage.exists(article.image.name):
             raise APIException(detail="This article doesn't have an image", code="no_file", status=status.HTTP_404_NOT_FOUND)
 
-        file_handle = article.image.open()
-
-        response = FileResponse(file_handle, content_type='whatever')
-        response['Content-Length'] = article.image.size
-
-        response['Content-Disposition'] = f'attachment; filename="{article.image.name}"'
-
-        return response
\ No newline at end of file
+        storage = article.image.storage
+        return serve_file(request, article.image,
+                          size=article.image.size,
+                          last_modified=storage.get_modified_time(article.image.name),
+                          content_type=mimetypes.guess_type(article.image.name)[0] or "application/octet-stream",
+                          filename=article.image.name)
\ No newline at end of file
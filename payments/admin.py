@@ -1,3 +1,23 @@
 from django.contrib import admin
+from .models import Invoice, Payment, IPNEvent
 
-# Register your models here.
+
+@admin.register(Invoice)
+class InvoiceAdmin(admin.ModelAdmin):
+    list_display = ["invoice_id", "user", "price_amount", "status", "created_at", "checked_at"]
+    list_filter = ["status"]
+    search_fields = ["invoice_id"]
+
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = ["payment_id", "user", "status", "actually_paid", "credited_amount", "updated_at"]
+    list_filter = ["status"]
+    search_fields = ["payment_id", "invoice_id"]
+    readonly_fields = ["credited_amount"]
+
+
+@admin.register(IPNEvent)
+class IPNEventAdmin(admin.ModelAdmin):
+    list_display = ["id", "payment_id", "received_at", "processed_at", "error"]
+    search_fields = ["payment_id"]
@@ -0,0 +1,174 @@
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+@dataclass
+class FaultConfig:
+    latency: float = 0.0
+    """
+    Задержка перед ответом в секундах
+    """
+    jitter: float = 0.0
+    """
+    Случайная добавка к задержке от 0 до jitter секунд
+    """
+    error_rate: float = 0.0
+    """
+    Доля запросов, на которые отвечает 500
+    """
+    hang_rate: float = 0.0
+    """
+    Доля запросов, которые зависают на hang_time секунд (для проверки read таймаута)
+    """
+    hang_time: float = 60.0
+
+
+class FakeNowPaymentsServer(ThreadingHTTPServer):
+    """
+    Локальная замена NOWPayments API для нагрузочных тестов и проверки отказов.
+    Реализует POST /v1/invoice и GET /v1/payment/?invoiceId=..., хранит счета и платежи в памяти. Ключ API не проверяется.
+    Платеж по счету имитируется запросом POST /fake/pay {"invoice_id", "status", "paid_ratio"} или методом add_payment
+    Запуск: python manage.py fake_nowpayments, затем PAYMENT_SERVICE_API_URL=http://localhost:8089/v1/
+    """
+    daemon_threads = True
+    USD_RATE = 0.00002
+    """
+    Курс валюты платежа к USD
+    """
+
+    faults: FaultConfig
+    invoices: dict[str, dict]
+
+    def __init__(self, address: tuple[str, int], faults: FaultConfig | None = None):
+        super().__init__(address, FakeNowPaymentsHandler)
+        self.faults = faults or FaultConfig()
+        self.invoices = {}
+        self.payments = {}
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def start_in_thread(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def create_invoice(self, data: dict) -> dict:
+        invoice_id = str(random.randint(10 ** 9, 10 ** 10 - 1))
+        invoice = {
+            "id": invoice_id,
+            "token_id": uuid.uuid4().hex[:10],
+            "order_id": data.get("order_id"),
+            "price_amount": str(data.get("price_amount")),
+            "price_currency": data.get("price_currency"),
+            "pay_currency": data.get("pay_currency"),
+            "ipn_callback_url": data.get("ipn_callback_url"),
+            "invoice_url": f"{self.base_url.removesuffix('/v1/')}/payment/?iid={invoice_id}",
+            "success_url": data.get("success_url"),
+            "cancel_url": data.get("cancel_url"),
+        }
+        with self.lock:
+            self.invoices[invoice_id] = invoice
+            self.payments[invoice_id] = []
+        return invoice
+
+    def add_payment(self, invoice_id: str, status: str = "finished", paid_ratio: float = 1.0) -> dict:
+        """
+        Добавляет платеж к счету или обновляет последний платеж счета
+        :param paid_ratio: Доля оплаченной суммы
+        """
+        with self.lock:
+            invoice = self.invoices[invoice_id]
+            payments = self.payments[invoice_id]
+            if not payments:
+                price = float(invoice["price_amount"])
+                payments.append({
+                    "payment_id": random.randint(10 ** 9, 10 ** 10 - 1),
+                    "invoice_id": int(invoice_id),
+                    "order_id": invoice["order_id"],
+                    "price_amount": price,
+                    "price_currency": invoice["price_currency"],
+                    "pay_amount": round(price * self.USD_RATE, 8),
+                    "pay_currency": "btc",
+                })
+            payment = payments[-1]
+            payment["payment_status"] = status
+            payment["actually_paid"] = round(payment["pay_amount"] * paid_ratio, 8)
+            return dict(payment)
+
+    def get_payments(self, invoice_id: str) -> list[dict]:
+        with self.lock:
+            return [dict(payment) for payment in self.payments.get(invoice_id, [])]
+
+
+class FakeNowPaymentsHandler(BaseHTTPRequestHandler):
+    server: FakeNowPaymentsServer
+    protocol_version = "HTTP/1.1"    # keep-alive, как у настоящего API
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not self.__apply_faults():
+            return
+
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            return self.__send(400, {"message": "Invalid JSON"})
+
+        path = urlsplit(self.path).path.rstrip("/")
+        if path == "/v1/invoice":
+            return self.__send(200, self.server.create_invoice(data))
+        if path == "/fake/pay":
+            try:
+                return self.__send(200, self.server.add_payment(str(data["invoice_id"]), data.get("status", "finished"),
+                                                                float(data.get("paid_ratio", 1.0))))
+            except KeyError:
+                return self.__send(404, {"message": "Invoice not found"})
+
+        self.__send(404, {"message": "Not found"})
+
+    def do_GET(self):
+        if not self.__apply_faults():
+            return
+
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") == "/v1/payment":
+            invoice_id = parse_qs(url.query).get("invoiceId", [""])[0]
+            payments = self.server.get_payments(invoice_id)
+            return self.__send(200, {"data": payments, "limit": len(payments), "page": 0, "pagesCount": 1, "total": len(payments)})
+
+        self.__send(404, {"message": "Not found"})
+
+    def __apply_faults(self) -> bool:
+        """
+        :return: False, если ответ уже отправлен (ошибка)
+        """
+        faults = self.server.faults
+        if random.random() < faults.hang_rate:
+            time.sleep(faults.hang_time)
+        time.sleep(faults.latency + random.uniform(0, faults.jitter))
+
+        if random.random() < faults.error_rate:
+            self.__send(500, {"message": "Injected failure"})
+            return False
+        return True
+
+    def __send(self, status: int, data: dict):
+        content = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
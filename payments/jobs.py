@@ -0,0 +1,12 @@
+from utils.scheduler import periodic
+from .services import PaymentEventProcessor, PaymentReconciler
+
+
+@periodic("process_ipn_events", interval=2)
+def process_ipn_events():
+    PaymentEventProcessor.process_pending()
+
+
+@periodic("reconcile_payments", interval=600)
+def reconcile_payments():
+    PaymentReconciler.reconcile()
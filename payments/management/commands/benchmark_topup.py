@@ -0,0 +1,78 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from payments.nowpayments_api import ClientConfig
+from payments.services import TopupProcessor
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ("Измеряет задержку TopupProcessor.request_topup. "
+            "Обычно запускается против fake_nowpayments (PAYMENT_SERVICE_API_URL=http://localhost:8089/v1/)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument("--amount", type=float, default=10)
+        parser.add_argument("--async", action="store_true", dest="use_async",
+                            help="Использовать AsyncNowPaymentsClient вместо TopupProcessor.request_topup")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options["use_async"]:
+            results = asyncio.run(self.run_async(options["requests"], options["concurrency"], options["amount"]))
+        else:
+            results = self.run_sync(options["requests"], options["concurrency"], options["amount"])
+        elapsed = time.perf_counter() - started
+
+        self.report(results, elapsed)
+
+    @staticmethod
+    def run_sync(count: int, concurrency: int, amount: float) -> list[tuple[float, bool]]:
+        # пользователь нужен только для order_id
+        user = User(id=0)
+
+        def topup(_) -> tuple[float, bool]:
+            started = time.perf_counter()
+            try:
+                TopupProcessor.request_topup(user, amount)
+                success = True
+            except TopupProcessor.PaymentServiceInteractionError:
+                success = False
+            return time.perf_counter() - started, success
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(topup, range(count)))
+
+    @staticmethod
+    async def run_async(count: int, concurrency: int, amount: float) -> list[tuple[float, bool]]:
+        from payments.nowpayments_async import AsyncNowPaymentsClient
+        from payments.nowpayments_api import APIError
+
+        semaphore = asyncio.Semaphore(concurrency)
+        async with AsyncNowPaymentsClient(ClientConfig.from_settings()) as client:
+            async def topup() -> tuple[float, bool]:
+                async with semaphore:
+                    started = time.perf_counter()
+                    try:
+                        await client.create_invoice(amount, "usd", order_id="0")
+                        success = True
+                    except APIError:
+                        success = False
+                    return time.perf_counter() - started, success
+
+            return await asyncio.gather(*(topup() for _ in range(count)))
+
+    def report(self, results: list[tuple[float, bool]], elapsed: float):
+        latencies = sorted(latency * 1000 for latency, _ in results)
+        failed = sum(1 for _, success in results if not success)
+
+        def percentile(value: float) -> float:
+            return latencies[min(len(latencies) - 1, int(len(latencies) * value))]
+
+        self.stdout.write(f"Requests: {len(results)}, failed: {failed}, elapsed: {elapsed:.2f}s, "
+                          f"throughput: {len(results) / elapsed:.1f} req/s")
+        self.stdout.write(f"Latency ms: mean {statistics.mean(latencies):.1f}, p50 {percentile(0.5):.1f}, "
+                          f"p95 {percentile(0.95):.1f}, p99 {percentile(0.99):.1f}, max {latencies[-1]:.1f}")
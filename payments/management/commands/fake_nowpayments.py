@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from payments.fake_nowpayments import FakeNowPaymentsServer, FaultConfig
+
+
+class Command(BaseCommand):
+    help = "Запускает локальную замену NOWPayments API с настраиваемой задержкой и ошибками"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8089)
+        parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа в секундах")
+        parser.add_argument("--jitter", type=float, default=0.0, help="Случайная добавка к задержке в секундах")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 500 (0..1)")
+        parser.add_argument("--hang-rate", type=float, default=0.0, help="Доля зависающих запросов (0..1)")
+        parser.add_argument("--hang-time", type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        faults = FaultConfig(latency=options["latency"], jitter=options["jitter"], error_rate=options["error_rate"],
+                             hang_rate=options["hang_rate"], hang_time=options["hang_time"])
+        server = FakeNowPaymentsServer((options["host"], options["port"]), faults)
+        self.stdout.write(f"Fake NOWPayments API is listening on {server.base_url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IPNEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('payment_id', models.CharField(db_index=True, max_length=64)),
+                ('payload', models.JSONField()),
+                ('fingerprint', models.CharField(max_length=64, unique=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, default=None, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='ipn_event_pending_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('payment_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('invoice_id', models.CharField(blank=True, default='', max_length=64)),
+                ('status', models.CharField(max_length=32)),
+                ('actually_paid', models.DecimalField(decimal_places=12, default=0, max_digits=24, verbose_name='Actually paid')),
+                ('pay_amount', models.DecimalField(decimal_places=12, default=0, max_digits=24)),
+                ('price_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Price, USD')),
+                ('credited_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Credited, USD')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payments', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -1,3 +1,90 @@
 from django.db import models
+from users.models import User
 
-# Create your models here.
+
+class Invoice(models.Model):
+    """
+    Счет NOWPayments, созданный при запросе пополнения. Статус обновляется по платежам счета.
+    Незавершенные счета периодически сверяются с NOWPayments (PaymentReconciler)
+    """
+    invoice_id = models.CharField(max_length=64, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='invoices')
+    price_amount = models.DecimalField("Price, USD", max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=32, default="waiting")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    checked_at = models.DateTimeField(null=True, default=None, blank=True)
+    """
+    Время последней сверки с NOWPayments
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),    # для выборки незавершенных счетов при сверке
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Invoice {self.invoice_id} ({self.status})"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class Payment(models.Model):
+    """
+    Платеж NOWPayments. Обновляется обработчиком IPN (PaymentEventProcessor), каждое изменение статуса применяется один раз
+    """
+    payment_id = models.CharField(max_length=64, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='payments')
+    invoice_id = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    status = models.CharField(max_length=32)
+    actually_paid = models.DecimalField("Actually paid", max_digits=24, decimal_places=12, default=0)
+    """
+    Максимальная полученная сумма в валюте платежа. NOWPayments передает в IPN накопленную сумму, а не прирост
+    """
+    pay_amount = models.DecimalField(max_digits=24, decimal_places=12, default=0)
+    price_amount = models.DecimalField("Price, USD", max_digits=10, decimal_places=2, default=0)
+    credited_amount = models.DecimalField("Credited, USD", max_digits=10, decimal_places=2, default=0)
+    """
+    Сумма, уже зачисленная на баланс пользователя. При следующем IPN зачисляется только разница
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Payment {self.payment_id} ({self.status})"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class IPNEvent(models.Model):
+    """
+    Входящий IPN. Сохраняется в обработчике запроса и применяется к Payment фоновой задачей process_ipn_events
+    в порядке получения. Повторная доставка того же IPN отбрасывается по fingerprint
+    """
+    id = models.BigAutoField(primary_key=True)
+    payment_id = models.CharField(max_length=64, db_index=True)
+    payload = models.JSONField()
+    fingerprint = models.CharField(max_length=64, unique=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, default=None, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["id"], name="ipn_event_pending_idx", condition=models.Q(processed_at__isnull=True)),    # для выборки необработанных событий
+        ]
+
+    def __str__(self):
+        return f"IPN event {self.id} (payment {self.payment_id})"
+
+    def __repr__(self):
+        return self.__str__()
@@ -1,5 +1,9 @@
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dataclasses import dataclass
+from django.conf import settings
 import json
 import hmac
 import hashlib
@@ -9,26 +13,42 @@ class APIError(Exception):
     pass
 
 
-def __get_auth_headers(api_key: str) -> dict:
-    return {"x-api-key": api_key}
-
-
 @dataclass
 class CreatedInvoice:
     id: str
     invoice_url: str
 
 
-def create_invoice(api_key: str,
-                   price: float,
-                   price_currency: str,
-                   pay_currency: str | None = None,
-                   callback_url: str | None = None,
-                   order_id: str | None = None,
-                   success_url: str | None = None,
-                   cancel_url: str | None = None,
-                   ) -> CreatedInvoice:
+@dataclass
+class ClientConfig:
+    api_key: str
+    base_url: str
+    connect_timeout: float
+    read_timeout: float
+    pool_size: int
+
+    @classmethod
+    def from_settings(cls) -> "ClientConfig":
+        return cls(api_key=settings.PAYMENT_SERVICE_API_KEY,
+                   base_url=settings.PAYMENT_SERVICE_API_URL,
+                   connect_timeout=settings.PAYMENT_SERVICE_CONNECT_TIMEOUT,
+                   read_timeout=settings.PAYMENT_SERVICE_READ_TIMEOUT,
+                   pool_size=settings.PAYMENT_SERVICE_POOL_SIZE)
+
+    def get_url(self, path: str) -> str:
+        return self.base_url.rstrip("/") + "/" + path.lstrip("/")
+
+    def get_auth_headers(self) -> dict:
+        return {"x-api-key": self.api_key}
 
+
+def build_invoice_data(price: float,
+                       price_currency: str,
+                       pay_currency: str | None = None,
+                       callback_url: str | None = None,
+                       order_id: str | None = None,
+                       success_url: str | None = None,
+                       cancel_url: str | None = None) -> dict:
     data = {"price_amount": price, "price_currency": price_currency}
     if pay_currency:
         data["pay_currency"] = pay_currency
@@ -40,18 +60,102 @@ def create_invoice(api_key: str,
         data["success_url"] = success_url
     if cancel_url:
         data["cancel_url"] = cancel_url
+    return data
+
+
+def parse_invoice_payments(status_code: int, text: str, data: dict | None) -> list[dict]:
+    if status_code != 200 or data is None:
+        raise APIError(f"Invalid status code {status_code}. Response: {text}")
+    return data.get("data", [])
+
+
+def parse_created_invoice(status_code: int, text: str, data: dict | None) -> CreatedInvoice:
+    if status_code != 200 or data is None:
+        raise APIError(f"Invalid status code {status_code}. Response: {text}")
+    return CreatedInvoice(str(data["id"]), data["invoice_url"])
+
+
+class NowPaymentsClient:
+    """
+    Клиент NOWPayments API с постоянной сессией: соединения переиспользуются (keep-alive), поэтому
+    TLS handshake выполняется один раз на соединение пула. Все запросы ограничены connect и read таймаутами.
+    Повторяются только неудачные попытки подключения - запрос в этом случае не был отправлен, поэтому счет не создается дважды.
+    Сессия потокобезопасна для параллельных запросов из потоков gunicorn, используйте общий экземпляр get_client()
+    """
+    CONNECT_RETRIES = 2
+
+    config: ClientConfig
+    session: requests.Session
+
+    def __init__(self, config: ClientConfig):
+        self.config = config
+        self.session = requests.Session()
+        self.session.headers.update(config.get_auth_headers())
+
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=config.pool_size,
+                              max_retries=Retry(total=None, connect=self.CONNECT_RETRIES, read=0, redirect=0, status=0,
+                                                other=0, backoff_factor=0.1, allowed_methods=None))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def timeout(self) -> tuple[float, float]:
+        return self.config.connect_timeout, self.config.read_timeout
+
+    def create_invoice(self, price: float, price_currency: str, **kwargs) -> CreatedInvoice:
+        """
+        :param kwargs: pay_currency, callback_url, order_id, success_url, cancel_url (см. build_invoice_data)
+        :raise APIError: Ответ с ошибкой или ошибка соединения, в т. ч. таймаут
+        """
+        try:
+            response = self.session.post(self.config.get_url("invoice"),
+                                         json=build_invoice_data(price, price_currency, **kwargs),
+                                         timeout=self.timeout)
+        except requests.RequestException as e:
+            raise APIError(f"Request failed: {e}") from e
+
+        return parse_created_invoice(response.status_code, response.text, self.__get_json(response))
+
+    def get_invoice_payments(self, invoice_id: str, limit: int = 100) -> list[dict]:
+        """
+        :return: Платежи счета в формате IPN (payment_id, payment_status, actually_paid, pay_amount, price_amount, order_id...)
+        :raise APIError: Ответ с ошибкой или ошибка соединения, в т. ч. таймаут
+        """
+        try:
+            response = self.session.get(self.config.get_url("payment/"),
+                                        params={"invoiceId": invoice_id, "limit": limit},
+                                        timeout=self.timeout)
+        except requests.RequestException as e:
+            raise APIError(f"Request failed: {e}") from e
+
+        return parse_invoice_payments(response.status_code, response.text, self.__get_json(response))
+
+    def close(self):
+        self.session.close()
+
+    @staticmethod
+    def __get_json(response: requests.Response) -> dict | None:
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
 
-    response = requests.post(
-        url="https://api.nowpayments.io/v1/invoice",
-        headers=__get_auth_headers(api_key),
-        json=data
-    )
+__client: NowPaymentsClient | None = None
+__client_lock = threading.Lock()
 
-    if response.status_code != 200:
-        raise APIError(f"Invalid status code {response.status_code}. Response: {response.text}")
 
-    json = response.json()
-    return CreatedInvoice(json["id"], json["invoice_url"])
+def get_client() -> NowPaymentsClient:
+    """
+    :return: Общий для процесса клиент с настройками из settings
+    """
+    global __client
+    if __client is None:
+        with __client_lock:
+            if __client is None:
+                __client = NowPaymentsClient(ClientConfig.from_settings())
+    return __client
 
 
 def is_ipn_sig_valid(np_secret_key: str, np_x_signature: str, message: dict) -> bool:
@@ -0,0 +1,66 @@
+import httpx
+from .nowpayments_api import (APIError, ClientConfig, CreatedInvoice, build_invoice_data, parse_created_invoice,
+                              parse_invoice_payments)
+
+
+class AsyncNowPaymentsClient:
+    """
+    Асинхронный вариант NowPaymentsClient на httpx с тем же пулом соединений и таймаутами.
+    Клиент привязан к event loop, в котором создан, закрывается через aclose() или async with
+    """
+    CONNECT_RETRIES = 2
+
+    config: ClientConfig
+    client: httpx.AsyncClient
+
+    def __init__(self, config: ClientConfig):
+        self.config = config
+        self.client = httpx.AsyncClient(
+            headers=config.get_auth_headers(),
+            timeout=httpx.Timeout(config.read_timeout, connect=config.connect_timeout),
+            # повторяются только ошибки подключения, как в NowPaymentsClient
+            transport=httpx.AsyncHTTPTransport(
+                retries=self.CONNECT_RETRIES,
+                limits=httpx.Limits(max_connections=config.pool_size, max_keepalive_connections=config.pool_size),
+            ),
+        )
+
+    async def create_invoice(self, price: float, price_currency: str, **kwargs) -> CreatedInvoice:
+        """
+        :param kwargs: pay_currency, callback_url, order_id, success_url, cancel_url (см. build_invoice_data)
+        :raise APIError: Ответ с ошибкой или ошибка соединения, в т. ч. таймаут
+        """
+        try:
+            response = await self.client.post(self.config.get_url("invoice"),
+                                              json=build_invoice_data(price, price_currency, **kwargs))
+        except httpx.HTTPError as e:
+            raise APIError(f"Request failed: {e!r}") from e
+
+        return parse_created_invoice(response.status_code, response.text, self.__get_json(response))
+
+    async def get_invoice_payments(self, invoice_id: str, limit: int = 100) -> list[dict]:
+        """
+        :return: Платежи счета в формате IPN, см. NowPaymentsClient.get_invoice_payments
+        """
+        try:
+            response = await self.client.get(self.config.get_url("payment/"), params={"invoiceId": invoice_id, "limit": limit})
+        except httpx.HTTPError as e:
+            raise APIError(f"Request failed: {e!r}") from e
+
+        return parse_invoice_payments(response.status_code, response.text, self.__get_json(response))
+
+    @staticmethod
+    def __get_json(response: httpx.Response) -> dict | None:
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
@@ -6,6 +6,7 @@ class TopupSerializer(serializers.Serializer):
 
 
 class NowpaymentsIPNSerializer(serializers.Serializer):
+    payment_id = serializers.CharField(write_only=True, max_length=64)
     invoice_id = serializers.CharField(write_only=True, allow_null=True)
     payment_status = serializers.CharField(write_only=True)
     price_amount = serializers.FloatField(write_only=True)
@@ -1,13 +1,26 @@
 import payments.nowpayments_api as api
 from django.conf import settings
-from users.models import User
+from users.models import User, BalanceEntry
+from users.services import BalanceLedger
 from django.urls import reverse
-from django.db import transaction
+from django.db import transaction, IntegrityError, DatabaseError
+from django.utils import timezone
 import traceback
 from utils.urls import get_absolute_url
+from utils.transactions import retry_on_serialization_failure, RetriesExhaustedError, is_serialization_failure
+from .models import Invoice, Payment, IPNEvent
+from .serializers import NowpaymentsIPNSerializer
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db.models import Q
 import decimal
+import hashlib
+import json
+import logging
 from typing import NewType
 
+logger = logging.getLogger(__name__)
+
 
 class PaymentServiceInfoProvider:
 
@@ -28,17 +41,13 @@ class TopupProcessor:
     class PaymentServiceInteractionError(Exception):
         pass
 
-    class InvalidOrderIdError(Exception):
-        pass
-
     @classmethod
     def request_topup(cls, user: User, amount: USDAmount) -> str:
         if amount < PaymentServiceInfoProvider.get_min_payment_amount():
             raise cls.InvalidAmountError
 
         try:
-            invoice = api.create_invoice(
-                settings.PAYMENT_SERVICE_API_KEY,
+            invoice = api.get_client().create_invoice(
                 amount,
                 "usd",
                 callback_url=get_absolute_url(reverse("nowpayments-ipn")),
@@ -46,32 +55,277 @@ class TopupProcessor:
                 success_url=get_absolute_url("topup/success"),
                 cancel_url=get_absolute_url("topup/fail")
             )
-
-            return invoice.invoice_url
         except Exception as e:
             traceback.print_exc()
             raise cls.PaymentServiceInteractionError from e
 
+        Invoice.objects.create(invoice_id=invoice.id, user=user, price_amount=decimal.Decimal(str(amount)))
+        return invoice.invoice_url
+
+
+class PaymentEventProcessor:
+    """
+    Асинхронная обработка IPN NOWPayments.
+    receive() только сохраняет событие, поэтому NOWPayments получает ответ сразу.
+    process_pending() применяет события к Payment в порядке получения: статус меняется только вперед,
+    завершенный платеж (FINAL_STATUSES) меняет статус только на статус с большим рангом (refunded),
+    на баланс зачисляется разница между накопленной суммой платежа (actually_paid) и уже зачисленной,
+    поэтому повторная доставка IPN не зачисляет деньги повторно
+    """
+    DATABASE = "serializeable"
+    BATCH_SIZE = 100
+
+    STATUS_RANKS = {
+        "waiting": 0,
+        "confirming": 1,
+        "confirmed": 2,
+        "sending": 3,
+        "partially_paid": 4,
+        "finished": 5,
+        "failed": 5,
+        "expired": 5,
+        "refunded": 6,
+    }
+    """
+    Порядок статусов платежа. Событие с меньшим рангом, чем текущий статус, не меняет статус
+    """
+    CREDITED_STATUSES = ("partially_paid", "finished")
+    """
+    Статусы, при которых полученная сумма зачисляется на баланс
+    """
+    FINAL_STATUSES = ("finished", "failed", "expired", "refunded")
+    IPN_FIELDS = ("payment_id", "invoice_id", "payment_status", "price_amount", "pay_amount", "actually_paid", "order_id")
+
+    class InvalidOrderIdError(Exception):
+        pass
+
     @classmethod
-    def update_topup_status(cls,
-                            order_id: str,
-                            status: str,
-                            actually_paid_in_currency: CryptoCurrencyAmount,
-                            target_amount_in_currency: CryptoCurrencyAmount,
-                            target_amount_in_usd: USDAmount):
-        if status not in ("partially_paid", "finished"):
-            return
+    def get_status_rank(cls, status: str) -> int:
+        return cls.STATUS_RANKS.get(status, 0)
 
-        with transaction.atomic(using="serializeable"):
+    @classmethod
+    def can_change_status(cls, current: str, new: str) -> bool:
+        """
+        Статус меняется только вперед. Завершенный статус не заменяется другим завершенным статусом того же ранга,
+        поэтому запоздавшее событие failed/expired не отменяет finished
+        """
+        if current in cls.FINAL_STATUSES:
+            return cls.get_status_rank(new) > cls.get_status_rank(current)
+        return cls.get_status_rank(new) >= cls.get_status_rank(current)
+
+    @staticmethod
+    def get_fingerprint(payload: dict) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    @classmethod
+    def receive(cls, payload: dict) -> bool:
+        """
+        Сохраняет IPN для обработки
+        :return: False, если такой же IPN уже был получен
+        """
+        try:
+            with transaction.atomic():
+                IPNEvent.objects.create(payment_id=str(payload["payment_id"]), payload=payload,
+                                        fingerprint=cls.get_fingerprint(payload))
+            return True
+        except IntegrityError:
+            return False
+
+    @classmethod
+    def process_pending(cls, batch_size: int = BATCH_SIZE) -> int:
+        """
+        Применяет необработанные события в порядке получения. Вызывается задачей process_ipn_events в одном процессе.
+        При конфликте транзакций обработка прерывается и продолжается при следующем запуске, чтобы не нарушать порядок
+        :return: Количество обработанных событий
+        """
+        processed = 0
+        while True:
+            event_ids = list(IPNEvent.objects.filter(processed_at__isnull=True)
+                             .order_by("id").values_list("id", flat=True)[:batch_size])
+            for event_id in event_ids:
+                try:
+                    cls.apply_event(event_id)
+                except RetriesExhaustedError:
+                    logger.warning("IPN event %s: concurrent update, will retry later", event_id)
+                    return processed
+                processed += 1
+
+            if len(event_ids) < batch_size:
+                return processed
+
+    @classmethod
+    @retry_on_serialization_failure("PaymentEventProcessor.apply_event", using=DATABASE)
+    def apply_event(cls, event_id: int):
+        with transaction.atomic(using=cls.DATABASE):
+            event = IPNEvent.objects.using(cls.DATABASE).get(id=event_id)
+            if event.processed_at is not None:
+                return
+
+            # событие с ошибкой не блокирует обработку следующих: ошибка сохраняется, событие считается обработанным
             try:
-                user = User.objects.get(id=int(order_id))
-            except User.DoesNotExist:
-                raise cls.InvalidOrderIdError
+                # savepoint, чтобы после ошибки БД можно было сохранить событие в той же транзакции
+                with transaction.atomic(using=cls.DATABASE):
+                    cls.__apply(event.payload)
+            except DatabaseError as e:
+                # конфликт сериализации - транзакция повторяется целиком (retry_on_serialization_failure)
+                if is_serialization_failure(e):
+                    raise
+                logger.error("IPN event %s failed: %r", event_id, e)
+                event.error = repr(e)
+            except (cls.InvalidOrderIdError, KeyError, ValueError, TypeError, ArithmeticError) as e:
+                logger.error("IPN event %s is invalid: %r", event_id, e)
+                event.error = repr(e)
+
+            event.processed_at = timezone.now()
+            event.save(update_fields=["processed_at", "error"])
+
+    @classmethod
+    def __apply(cls, data: dict):
+        payment = Payment.objects.using(cls.DATABASE).filter(payment_id=str(data["payment_id"])).first()
+        invoice = Invoice.objects.using(cls.DATABASE).filter(invoice_id=str(data.get("invoice_id") or "")).first()
+        if payment is None:
+            # счета, созданные до появления Invoice, определяются по order_id
+            user = invoice.user if invoice and invoice.user_id else cls.__get_user(data.get("order_id"))
+            payment = Payment(payment_id=str(data["payment_id"]), user=user,
+                              invoice_id=str(data.get("invoice_id") or ""), status=data["payment_status"])
+
+        status = data["payment_status"]
+        if cls.can_change_status(payment.status, status):
+            payment.status = status
+        if invoice and cls.get_status_rank(payment.status) > cls.get_status_rank(invoice.status):
+            invoice.status = payment.status
+            invoice.save(update_fields=["status", "updated_at"])
+
+        actually_paid = decimal.Decimal(str(data["actually_paid"]))
+        payment.actually_paid = max(payment.actually_paid, actually_paid)
+        payment.pay_amount = decimal.Decimal(str(data["pay_amount"]))
+        payment.price_amount = decimal.Decimal(str(data["price_amount"]))
+
+        if status in cls.CREDITED_STATUSES and payment.user_id is not None:
+            cls.__credit(payment)
+
+        payment.save(using=cls.DATABASE)
+
+    @classmethod
+    def __credit(cls, payment: Payment):
+        """
+        Зачисляет на баланс разницу между накопленной суммой платежа (payment.actually_paid) в USD и уже зачисленной суммой.
+        Сумма из события не используется: события частичной оплаты и завершения содержат одну и ту же накопленную сумму
+        """
+        if not payment.pay_amount:
+            return
+
+        paid_in_usd = (payment.price_amount * payment.actually_paid / payment.pay_amount).quantize(decimal.Decimal("0.01"), rounding=decimal.ROUND_DOWN)
+        delta = paid_in_usd - payment.credited_amount
+        if delta <= 0:
+            return
+
+        BalanceLedger.credit(payment.user, delta, BalanceEntry.KIND_TOPUP, f"payment:{payment.payment_id}", using=cls.DATABASE)
+        payment.credited_amount = paid_in_usd
+        logger.info("Payment %s: credited %s USD to user %s", payment.payment_id, delta, payment.user_id)
+
+    @classmethod
+    def __get_user(cls, order_id: str | None) -> User:
+        try:
+            return User.objects.using(cls.DATABASE).get(id=int(order_id))
+        except (User.DoesNotExist, TypeError, ValueError):
+            raise cls.InvalidOrderIdError(f"Invalid order ID: {order_id}")
+
 
-            actually_paid_in_usd: USDAmount = USDAmount(target_amount_in_usd * (actually_paid_in_currency / target_amount_in_currency))
+class PaymentReconciler:
+    """
+    Сверка незавершенных счетов с NOWPayments на случай потерянных IPN.
+    Счета запрашиваются пачками параллельно через общий пул соединений клиента,
+    найденные платежи передаются в PaymentEventProcessor как обычные IPN, поэтому уже примененные изменения не повторяются
+    """
+    BATCH_SIZE = 50
+    STALE_AFTER = timedelta(minutes=10)
+    """
+    Счет сверяется, если по нему не было завершающего IPN за это время
+    """
+    RECHECK_INTERVAL = timedelta(minutes=10)
+    EXPIRE_AFTER = timedelta(days=1)
+    """
+    Счет без платежей считается истекшим
+    """
+    MAX_AGE = timedelta(days=7)
+    """
+    Более старые счета не сверяются
+    """
 
-            user.balance += decimal.Decimal(actually_paid_in_usd)
-            user.save()
-        print(f"Updated balance of user {user.id}: {actually_paid_in_usd} (new balance: {user.balance})")
+    @classmethod
+    def get_pending_statuses(cls) -> list[str]:
+        return [status for status in PaymentEventProcessor.STATUS_RANKS if status not in PaymentEventProcessor.FINAL_STATUSES]
 
+    @classmethod
+    def reconcile(cls, batch_size: int = BATCH_SIZE) -> int:
+        """
+        Сверяет пачками все счета, которые давно не проверялись, пока пачка не окажется неполной.
+        Счета, которые не удалось запросить, исключаются до следующего запуска
+        :return: Количество новых событий платежей
+        """
+        now = timezone.now()
+        received = 0
+        failed = []
+        while True:
+            invoices = list(Invoice.objects
+                            .filter(status__in=cls.get_pending_statuses(),
+                                    created_at__lte=now - cls.STALE_AFTER,
+                                    created_at__gte=now - cls.MAX_AGE)
+                            .filter(Q(checked_at__isnull=True) | Q(checked_at__lte=now - cls.RECHECK_INTERVAL))
+                            .exclude(invoice_id__in=failed)
+                            .order_by("created_at")[:batch_size])
+            if not invoices:
+                return received
 
+            batch_received, batch_failed = cls.__reconcile_batch(invoices, now)
+            received += batch_received
+            failed.extend(batch_failed)
+
+            if len(invoices) < batch_size:
+                return received
+
+    @classmethod
+    def __reconcile_batch(cls, invoices: list[Invoice], now) -> tuple[int, list[str]]:
+        """
+        :return: Количество новых событий платежей и ID счетов, которые не удалось запросить
+        """
+        with ThreadPoolExecutor(max_workers=settings.PAYMENT_SERVICE_POOL_SIZE) as executor:
+            results = list(executor.map(cls.__fetch_payments, invoices))
+
+        received = 0
+        checked = []
+        failed = []
+        for invoice, payments in zip(invoices, results):
+            # ошибка запроса, счет будет сверен при следующем запуске
+            if payments is None:
+                failed.append(invoice.invoice_id)
+                continue
+
+            for payment in payments:
+                payload = {field: payment.get(field) for field in PaymentEventProcessor.IPN_FIELDS}
+                payload["invoice_id"] = invoice.invoice_id
+                payload["order_id"] = payload["order_id"] or str(invoice.user_id)
+                # платежи из API проверяются так же, как IPN
+                serializer = NowpaymentsIPNSerializer(data=payload)
+                if not serializer.is_valid():
+                    logger.warning("Invalid payment of invoice %s: %s", invoice.invoice_id, serializer.errors)
+                    continue
+                received += PaymentEventProcessor.receive(payload)
+
+            if not payments and invoice.created_at <= now - cls.EXPIRE_AFTER:
+                invoice.status = "expired"
+            invoice.checked_at = now
+            checked.append(invoice)
+
+        Invoice.objects.bulk_update(checked, ["status", "checked_at"])
+        logger.info("Reconciled %s invoices, %s new payment events", len(checked), received)
+        return received, failed
+
+    @staticmethod
+    def __fetch_payments(invoice: Invoice) -> list[dict] | None:
+        try:
+            return api.get_client().get_invoice_payments(invoice.invoice_id)
+        except api.APIError as e:
+            logger.warning("Failed to fetch payments of invoice %s: %s", invoice.invoice_id, e)
+            return None
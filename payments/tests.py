@@ -0,0 +1,126 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.test import TransactionTestCase
+from django.utils import timezone
+from users.models import User
+from users.services import BalanceLedger
+from . import nowpayments_api as api
+from .fake_nowpayments import FakeNowPaymentsServer
+from .models import Invoice, Payment, IPNEvent
+from .services import PaymentReconciler, PaymentEventProcessor
+
+
+class PaymentReconcilerTests(TransactionTestCase):
+    """
+    Сверка счетов с локальной заменой NOWPayments (FakeNowPaymentsServer): платеж с потерянным IPN зачисляется один раз
+    """
+    databases = {"default", "serializeable"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeNowPaymentsServer(("127.0.0.1", 0))
+        cls.server.start_in_thread()
+        cls.api_client = api.NowPaymentsClient(api.ClientConfig(api_key="test", base_url=cls.server.base_url,
+                                                                connect_timeout=1, read_timeout=5, pool_size=4))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.api_client.close()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create(username="customer")
+        patcher = mock.patch.object(api, "get_client", return_value=self.api_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_invoice(self, price: int = 10) -> Invoice:
+        """
+        Счет, созданный раньше PaymentReconciler.STALE_AFTER, IPN по которому не приходили
+        """
+        data = self.server.create_invoice({"price_amount": price, "price_currency": "usd", "order_id": str(self.user.id)})
+        invoice = Invoice.objects.create(invoice_id=data["id"], user=self.user, price_amount=price)
+        Invoice.objects.filter(invoice_id=invoice.invoice_id).update(created_at=timezone.now() - timedelta(minutes=30))
+        return invoice
+
+    def reconcile(self, **kwargs) -> int:
+        received = PaymentReconciler.reconcile(**kwargs)
+        PaymentEventProcessor.process_pending()
+        return received
+
+    def get_balance(self) -> Decimal:
+        return BalanceLedger.get_balance(self.user)
+
+    def test_missed_ipn_credited_once(self):
+        invoice = self.create_invoice()
+        self.server.add_payment(invoice.invoice_id, "finished")
+
+        self.assertEqual(self.reconcile(), 1)
+        self.assertEqual(self.get_balance(), Decimal("10.00"))
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.status, "finished")
+
+        # повторная сверка того же платежа
+        Invoice.objects.filter(invoice_id=invoice.invoice_id).update(status="waiting", checked_at=None)
+        self.assertEqual(self.reconcile(), 0)
+        self.assertEqual(self.get_balance(), Decimal("10.00"))
+
+    def test_partial_payment_credited_by_difference(self):
+        invoice = self.create_invoice()
+        self.server.add_payment(invoice.invoice_id, "partially_paid", paid_ratio=0.5)
+        self.reconcile()
+        self.assertEqual(self.get_balance(), Decimal("5.00"))
+
+        self.server.add_payment(invoice.invoice_id, "finished")
+        Invoice.objects.filter(invoice_id=invoice.invoice_id).update(checked_at=None)
+        self.reconcile()
+        self.assertEqual(self.get_balance(), Decimal("10.00"))
+        self.assertEqual(Payment.objects.get(invoice_id=invoice.invoice_id).credited_amount, Decimal("10.00"))
+
+    def test_backlog_larger_than_batch(self):
+        invoices = [self.create_invoice(price=1) for i in range(5)]
+        for invoice in invoices:
+            self.server.add_payment(invoice.invoice_id, "finished")
+
+        self.assertEqual(self.reconcile(batch_size=2), 5)
+        self.assertEqual(self.get_balance(), Decimal("5.00"))
+        self.assertFalse(Invoice.objects.filter(checked_at__isnull=True).exists())
+
+
+class PaymentEventProcessorTests(TransactionTestCase):
+    """
+    Применение IPN: статус завершенного платежа не откатывается, событие с ошибкой не останавливает очередь
+    """
+    databases = {"default", "serializeable"}
+
+    def setUp(self):
+        self.user = User.objects.create(username="customer")
+
+    def receive(self, **data):
+        payload = {"payment_id": "1", "invoice_id": None, "payment_status": "finished", "price_amount": 10,
+                   "pay_amount": "0.002", "actually_paid": "0.002", "order_id": str(self.user.id)}
+        payload.update(data)
+        PaymentEventProcessor.receive(payload)
+
+    def test_final_status_not_replaced_by_late_event(self):
+        self.receive(payment_status="finished")
+        self.receive(payment_status="failed")
+        PaymentEventProcessor.process_pending()
+        self.assertEqual(Payment.objects.get(payment_id="1").status, "finished")
+
+        self.receive(payment_status="refunded")
+        PaymentEventProcessor.process_pending()
+        self.assertEqual(Payment.objects.get(payment_id="1").status, "refunded")
+
+    def test_invalid_event_does_not_block_queue(self):
+        self.receive(payment_id="2", payment_status=None)
+        self.receive(payment_status="finished")
+
+        self.assertEqual(PaymentEventProcessor.process_pending(), 2)
+        self.assertFalse(IPNEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertNotEqual(IPNEvent.objects.get(payment_id="2").error, "")
+        self.assertEqual(BalanceLedger.get_balance(self.user), Decimal("10.00"))
@@ -1,14 +1,14 @@
-import time
 from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework import permissions, status
 from utils.exceptions import APIException
-from .services import PaymentServiceInfoProvider, TopupProcessor, CryptoCurrencyAmount, USDAmount
+from .services import PaymentServiceInfoProvider, TopupProcessor, PaymentEventProcessor
 from .serializers import TopupSerializer, NowpaymentsIPNSerializer
 from payments.nowpayments_api import is_ipn_sig_valid
 from django.conf import settings
+from idempotency.decorators import idempotent
 
 
 class PaymentServiceInfo(APIView):
@@ -21,6 +21,7 @@ class PaymentServiceInfo(APIView):
 class TopupView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
 
+    @idempotent()
     def post(self, request):
         serializer = TopupSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -50,14 +51,8 @@ class NowpaymentsIPNView(APIView):
         serializer = NowpaymentsIPNSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        try:
-            TopupProcessor.update_topup_status(serializer.validated_data["order_id"],
-                                               serializer.validated_data["payment_status"],
-                                               CryptoCurrencyAmount(serializer.validated_data["actually_paid"]),
-                                               CryptoCurrencyAmount(serializer.validated_data["pay_amount"]),
-                                               USDAmount(serializer.validated_data["price_amount"]))
-        except TopupProcessor.InvalidOrderIdError:
-            raise APIException("Invalid order ID", code="invalid_order_id", status=status.HTTP_400_BAD_REQUEST)
+        # IPN применяется фоновой задачей process_ipn_events, повторно доставленный IPN игнорируется
+        PaymentEventProcessor.receive(request.data)
 
         return Response(status=status.HTTP_200_OK)
 
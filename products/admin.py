@@ -6,7 +6,9 @@ from django.db.models.fields.files import FieldFile
 from django.db.models import FileField
 from django.contrib.admin.widgets import AdminFileWidget
 from .models import Category, Product
-from .services import ProductFileManager
+from .services import ProductFileManager, CategoryCounterService
+from seller.services import SellerStatsService
+from django.db import transaction
 from django.urls import reverse
 
 
@@ -100,4 +102,33 @@ class ProductAdmin(admin.ModelAdmin):
         FileField: {"widget": ProductFileInputWidget},
     }
 
+    # в админке можно изменить категорию, цену, покупателя или удалить товары в обход сервисов,
+    # поэтому счетчики затронутых категорий и статистика селлеров пересчитываются полностью после коммита
+    def save_model(self, request, obj, form, change):
+        category_ids = {obj.category_id}
+        seller_ids = {obj.seller_id}
+        if change and "category" in form.changed_data:
+            category_ids.add(form.initial.get("category"))
+        if change and "seller" in form.changed_data:
+            seller_ids.add(form.initial.get("seller"))
+        super().save_model(request, obj, form, change)
+        self.__recount_on_commit(category_ids, seller_ids)
+
+    def delete_model(self, request, obj):
+        category_ids = {obj.category_id}
+        seller_ids = {obj.seller_id}
+        super().delete_model(request, obj)
+        self.__recount_on_commit(category_ids, seller_ids)
+
+    def delete_queryset(self, request, queryset):
+        category_ids = set(queryset.values_list("category_id", flat=True))
+        seller_ids = set(queryset.values_list("seller_id", flat=True))
+        super().delete_queryset(request, queryset)
+        self.__recount_on_commit(category_ids, seller_ids)
+
+    @staticmethod
+    def __recount_on_commit(category_ids: set, seller_ids: set):
+        transaction.on_commit(lambda: CategoryCounterService.recount(category_ids))
+        transaction.on_commit(lambda: SellerStatsService.recount(seller_ids))
+
 
@@ -0,0 +1,12 @@
+from utils.scheduler import periodic
+from .services import ProductFileCleaner, ProductReservationSweeper
+
+
+@periodic("prune_files", interval=3600)
+def prune_files():
+    ProductFileCleaner.prune_outdated_files()
+
+
+@periodic("release_expired_reservations", interval=15)
+def release_expired_reservations():
+    ProductReservationSweeper.release_expired()
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from products.services import ProductFileCleaner
+from utils.locks import advisory_lock
 
 
 class Command(BaseCommand):
@@ -7,5 +8,10 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         self.stdout.write("Pruning outdated files...")
-        files = ProductFileCleaner.prune_outdated_files()
+        # та же блокировка, что у задачи prune_files в планировщике
+        with advisory_lock("scheduler:prune_files") as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING("Pruning is already running in another process"))
+                return
+            files = ProductFileCleaner.prune_outdated_files()
         self.stdout.write(self.style.SUCCESS(f'Successfully pruned outdated files: {", ".join(files)}'))
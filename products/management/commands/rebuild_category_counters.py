@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from products.services import CategoryCounterService
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счетчики доступных товаров во всех категориях"
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding category counters...")
+        updated = CategoryCounterService.recount()
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt counters of {updated} categories'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from products.services import ProductFileReconciler
+
+
+class Command(BaseCommand):
+    help = "Сверяет сохраненные сведения о файлах товаров (наличие, размер, тип) с хранилищем и исправляет расхождения"
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconciling product files...")
+        fixed = ProductFileReconciler.reconcile()
+        self.stdout.write(self.style.SUCCESS(f'Successfully reconciled product files. Fixed products: {", ".join(map(str, fixed))}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import autodiscover_modules
+from utils.scheduler import Scheduler, get_jobs
+
+
+class Command(BaseCommand):
+    help = "Запускает планировщик периодических задач (модули jobs.py приложений) в текущем процессе"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--job", action="append", dest="jobs", help="Запускать только указанные задачи")
+        parser.add_argument("--exclude-job", action="append", dest="excluded_jobs",
+                            help="Не запускать указанные задачи (например, если они выполняются отдельным процессом)")
+
+    def handle(self, *args, **options):
+        autodiscover_modules("jobs")
+
+        jobs = get_jobs()
+        if options["jobs"]:
+            jobs = [job for job in jobs if job.name in options["jobs"]]
+        if options["excluded_jobs"]:
+            jobs = [job for job in jobs if job.name not in options["excluded_jobs"]]
+
+        Scheduler(jobs).run_forever()
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:46
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_available_products(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+
+    available_count = (Product.objects.filter(category=OuterRef('pk'), purchased_by__isnull=True)
+                       .exclude(file__isnull=True).exclude(file__exact='')
+                       .order_by().values('category').annotate(count=Count('id')).values('count'))
+    Category.objects.update(available_products_count=Coalesce(Subquery(available_count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_category_is_service'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='available_products_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Available products'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['ordering_value', 'id'], name='products_ca_orderin_97be14_idx'),
+        ),
+        migrations.RunPython(count_available_products, migrations.RunPython.noop),
+    ]
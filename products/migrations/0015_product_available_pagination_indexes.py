@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_category_available_products_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('purchased_by__isnull', True)), fields=['category', 'added_at', 'id'], name='available_category_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('purchased_by__isnull', True)), fields=['added_at', 'id'], name='available_added_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:50
+
+from django.db import migrations, models
+
+
+def mark_present_files(apps, schema_editor):
+    # размер и тип заполняются командой reconcile_product_files, которая проверяет файлы в хранилище
+    Product = apps.get_model('products', 'Product')
+    Product.objects.exclude(file__isnull=True).exclude(file__exact='').update(file_present=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_product_available_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='file_content_type',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='File content type'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='file_present',
+            field=models.BooleanField(default=False, editable=False, verbose_name='File present'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='file_size',
+            field=models.PositiveIntegerField(blank=True, default=None, editable=False, null=True, verbose_name='File size'),
+        ),
+        migrations.RunPython(mark_present_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_product_file_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='file_updated_at',
+            field=models.DateTimeField(blank=True, default=None, editable=False, null=True, verbose_name='File updated at'),
+        ),
+    ]
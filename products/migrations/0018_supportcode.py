@@ -0,0 +1,57 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:56
+
+import itertools
+import random
+from datetime import datetime, timedelta, timezone
+
+from django.db import migrations, models
+from django.db.models import Max
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+CODE_LENGTH = 4
+SUPPORT_PERIOD = timedelta(days=1)    # ProductSupportService.SUPPORT_PERIOD на момент миграции
+BATCH_SIZE = 10000
+
+
+def fill_support_codes(apps, schema_editor):
+    SupportCode = apps.get_model('products', 'SupportCode')
+    Product = apps.get_model('products', 'Product')
+    db = schema_editor.connection.alias
+
+    # коды выдаются в порядке available_at, поэтому случайный порядок начальных значений
+    # сохраняет непредсказуемость кодов, как при случайной генерации
+    codes = ["".join(chars) for chars in itertools.product(ALPHABET, repeat=CODE_LENGTH)]
+    random.shuffle(codes)
+    start = datetime(2000, 1, 1, tzinfo=timezone.utc)
+    for offset in range(0, len(codes), BATCH_SIZE):
+        SupportCode.objects.using(db).bulk_create(
+            SupportCode(code=code, available_at=start + timedelta(seconds=offset + index))
+            for index, code in enumerate(codes[offset:offset + BATCH_SIZE])
+        )
+
+    # коды товаров, период поддержки которых еще не закончился, освобождаются после его окончания
+    in_support = (Product.objects.using(db)
+                  .filter(purchased_at__gt=datetime.now(timezone.utc) - SUPPORT_PERIOD)
+                  .exclude(support_code='')
+                  .values('support_code').annotate(purchased_at=Max('purchased_at')))
+    for row in in_support:
+        (SupportCode.objects.using(db).filter(code=row['support_code'])
+         .update(available_at=row['purchased_at'] + SUPPORT_PERIOD))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_product_file_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupportCode',
+            fields=[
+                ('code', models.CharField(max_length=4, primary_key=True, serialize=False)),
+                ('available_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.RunPython(fill_support_codes, migrations.RunPython.noop),
+    ]
@@ -4,7 +4,7 @@ from users.models import User
 
 class HasAvailableProductsManager(models.Manager):
     def get_queryset(self):
-        return super().get_queryset().filter(products__isnull=False, products__purchased_by__isnull=True).distinct()
+        return super().get_queryset().filter(available_products_count__gt=0)
 
 
 class Category(models.Model):
@@ -16,14 +16,18 @@ class Category(models.Model):
     """
     Should products in this category be displayed and processed as services
     """
+    available_products_count = models.IntegerField("Available products", default=0, editable=False)
+    """
+    Количество доступных для покупки товаров в категории. Поддерживается CategoryCounterService, пересчитывается командой rebuild_category_counters
+    """
     objects = models.Manager()
     has_available_products = HasAvailableProductsManager()
 
     class Meta:
         verbose_name_plural = "categories"
-
-    def get_products_count(self):
-        return self.products.filter(purchased_by__isnull=True).distinct().count()
+        indexes = [
+            models.Index(fields=["ordering_value", "id"]),    # для списка категорий
+        ]
 
     def __str__(self):
         return self.name
@@ -34,7 +38,7 @@ class Category(models.Model):
 
 class AvailableManager(models.Manager):
     def get_queryset(self):
-        return super().get_queryset().filter(purchased_by=None).exclude(file__isnull=True).exclude(file__exact='')
+        return super().get_queryset().filter(purchased_by=None, file_present=True, reserved_by=None)
 
 
 class Product(models.Model):
@@ -50,7 +54,19 @@ class Product(models.Model):
     purchased_at = models.DateTimeField(null=True, default=None, blank=True)
     purchased_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, default=None, blank=True, related_name='purchased_products')
     file = models.FileField(null=True, default=None, blank=True)
+    file_present = models.BooleanField("File present", default=False, editable=False)
+    """
+    Файл сохранен в хранилище. Поддерживается ProductFileManager, чтобы не проверять наличие файла на диске
+    """
+    file_size = models.PositiveIntegerField("File size", null=True, default=None, blank=True, editable=False)
+    file_content_type = models.CharField("File content type", max_length=100, default='', blank=True, editable=False)
+    file_updated_at = models.DateTimeField("File updated at", null=True, default=None, blank=True, editable=False)
     support_code = models.CharField(max_length=4, default='')
+    reserved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, default=None, blank=True, related_name='reserved_products')
+    """
+    Покупатель, за которым товар временно закреплен (см. ProductReserver). Зарезервированный товар скрыт из Product.available
+    """
+    reserved_until = models.DateTimeField(null=True, default=None, blank=True)
 
     objects = models.Manager()
     available = AvailableManager()
@@ -62,7 +78,10 @@ class Product(models.Model):
         ]
         indexes = [
             models.Index(fields=['category']),    # для запроса товаров определенной категории
-            models.Index(fields=['purchased_by']),    # для списка покупок пользователя
+            models.Index(
+                fields=['purchased_by', '-purchased_at', '-id'],
+                name='purchases_idx'
+            ),    # для постраничного списка покупок пользователя
             models.Index(
                 fields=['-purchased_at'],
                 name='file_not_null_not_empty_idx',
@@ -70,7 +89,22 @@ class Product(models.Model):
             ),    # для очистки файлов
             models.Index(fields=['seller', 'purchased_by', "-added_at"]),    # для фильтров в селлер панели
             models.Index(fields=['seller', "purchased_by", "-purchased_at"]),    # для фильтров в селлер панели
-            models.Index(fields=["support_code", "-purchased_at"])
+            models.Index(fields=["support_code", "-purchased_at"]),
+            models.Index(
+                fields=["category", "added_at", "id"],
+                name="available_category_added_idx",
+                condition=models.Q(purchased_by__isnull=True)
+            ),    # для постраничного списка товаров категории
+            models.Index(
+                fields=["added_at", "id"],
+                name="available_added_idx",
+                condition=models.Q(purchased_by__isnull=True)
+            ),    # для постраничного списка всех товаров
+            models.Index(
+                fields=["reserved_until"],
+                name="reserved_until_idx",
+                condition=models.Q(reserved_by__isnull=False)
+            ),    # для снятия истекших резервов
         ]
 
     def __str__(self):
@@ -78,3 +112,16 @@ class Product(models.Model):
 
     def __repr__(self):
         return self.__str__()
+
+
+class SupportCode(models.Model):
+    """
+    Пул кодов поддержки. Код выдается при покупке товара и становится снова доступным (available_at)
+    после окончания периода поддержки, поэтому выдача кода - один индексированный запрос без перебора случайных кодов.
+    Таблица заполняется всеми кодами в миграции 0018_supportcode
+    """
+    code = models.CharField(max_length=4, primary_key=True)
+    available_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.code
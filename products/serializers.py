@@ -1,13 +1,17 @@
+import csv
+import io
+import json
+import os.path
 from rest_framework import serializers
 from rest_framework.fields import CharField, SerializerMethodField
 from .models import Category, Product
-from .services import ProductCreator, ProductSupportService, ProductFileManager
+from .services import ProductCreator, ProductSupportService, ProductFileManager, ProductCartBuyer, ProductBulkCreator
 from .validators import *
 from users.models import User
 
 
 class CategorySerializer(serializers.ModelSerializer):
-    products_count = serializers.IntegerField(source="get_products_count", read_only=True)
+    products_count = serializers.IntegerField(source="available_products_count", read_only=True)
 
     class Meta:
         model = Category
@@ -37,9 +41,14 @@ class ProductSerializer(serializers.ModelSerializer):
     def __can_read_support_info(user: User) -> bool:
         return user.has_perm("products.read_support_info")
 
+    file = serializers.FileField(write_only=True, required=False)
+    """
+    Файл товара можно передать в запросе создания (multipart), тогда товар и файл сохраняются вместе
+    """
+
     class Meta:
         model = Product
-        fields = ['id', 'description', 'category', 'number', 'score', 'produced_at', 'price']
+        fields = ['id', 'description', 'category', 'number', 'score', 'produced_at', 'price', 'file']
         read_only_fields = ["id"]
         validators = []
 
@@ -59,6 +68,16 @@ class ProductSerializer(serializers.ModelSerializer):
     def validate_price(value):
         return PriceValidator()(value)
 
+    @staticmethod
+    def validate_file(value):
+        try:
+            ProductFileManager.validate_file(value)
+        except ProductFileManager.InvalidFileTypeError as e:
+            raise serializers.ValidationError(str(e), code="invalid_file_type")
+        except ProductFileManager.FileTooLargeError:
+            raise serializers.ValidationError("File is too large", code="file_too_large")
+        return value
+
     @staticmethod
     def get_is_support_period_expired(instance: Product):
         return ProductSupportService(instance).is_support_period_expired()
@@ -90,9 +109,161 @@ class ProductSerializer(serializers.ModelSerializer):
                 validated_data['number'],
                 validated_data['score'],
                 validated_data['produced_at'],
-                validated_data['price']
+                validated_data['price'],
+                validated_data.get('file')
             ).create()
         except ProductCreator.InvalidSellerError as e:
             raise serializers.ValidationError(e)
 
         return product
+
+
+class CartCheckoutSerializer(serializers.Serializer):
+    products = serializers.ListField(child=serializers.IntegerField(min_value=1),
+                                     min_length=1,
+                                     max_length=ProductCartBuyer.MAX_PRODUCTS)
+
+
+class CartItemResultSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(read_only=True)
+    purchased = serializers.BooleanField(read_only=True)
+    error = serializers.CharField(read_only=True, allow_null=True)
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """
+    Строка манифеста импорта. В context должны быть categories ({ID: Category}), files ({имя: файл})
+    и used_files (множество уже использованных имен файлов)
+    """
+    description = serializers.CharField(allow_blank=True)
+    category = serializers.IntegerField()
+    number = serializers.CharField()
+    score = serializers.CharField()
+    produced_at = serializers.DateTimeField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    file = serializers.CharField(required=False, allow_blank=True, default="")
+    """
+    Имя файла из files запроса. Пустое - товар без файла
+    """
+
+    @staticmethod
+    def validate_description(value):
+        return DescriptionValidator()(value)
+
+    @staticmethod
+    def validate_number(value):
+        return NumberValidator()(value)
+
+    @staticmethod
+    def validate_score(value):
+        return ScoreValidator()(value)
+
+    @staticmethod
+    def validate_price(value):
+        return PriceValidator()(value)
+
+    def validate_category(self, value):
+        category = self.context["categories"].get(value)
+        if category is None:
+            raise serializers.ValidationError(f"Category {value} doesn't exist")
+        return category
+
+    def validate_file(self, value):
+        if not value:
+            return None
+
+        file = self.context["files"].get(value)
+        if file is None:
+            raise serializers.ValidationError(f"File '{value}' is not uploaded")
+        if value in self.context["used_files"]:
+            raise serializers.ValidationError(f"File '{value}' is used by another row")
+
+        try:
+            ProductFileManager.validate_file(file, set_safe_name=False)
+        except ProductFileManager.InvalidFileTypeError as e:
+            raise serializers.ValidationError(str(e), code="invalid_file_type")
+        except ProductFileManager.FileTooLargeError:
+            raise serializers.ValidationError("File is too large", code="file_too_large")
+
+        self.context["used_files"].add(value)
+        return file
+
+
+class ProductImportSerializer(serializers.Serializer):
+    """
+    Манифест импорта (CSV с заголовком или JSON-массив объектов с полями ProductImportRowSerializer) и файлы товаров
+    """
+    MANIFEST_MAX_SIZE_BYTES = 1024 * 1024
+
+    manifest = serializers.FileField()
+    files = serializers.ListField(child=serializers.FileField(), required=False, default=list,
+                                  max_length=ProductBulkCreator.MAX_PRODUCTS)
+
+    def validate_manifest(self, value) -> list[dict]:
+        if value.size > self.MANIFEST_MAX_SIZE_BYTES:
+            raise serializers.ValidationError("Manifest is too large")
+
+        path, ext = os.path.splitext(value.name)
+        try:
+            content = value.read().decode("utf-8-sig")
+            if ext.lower() == ".json":
+                rows = json.loads(content)
+            elif ext.lower() == ".csv":
+                rows = list(csv.DictReader(io.StringIO(content)))
+            else:
+                raise serializers.ValidationError("Manifest must be a .csv or .json file")
+        except (UnicodeDecodeError, ValueError, csv.Error) as e:
+            raise serializers.ValidationError(f"Failed to parse manifest: {e}")
+
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise serializers.ValidationError("Manifest must contain a list of objects")
+        if not rows:
+            raise serializers.ValidationError("Manifest is empty")
+        if len(rows) > ProductBulkCreator.MAX_PRODUCTS:
+            raise serializers.ValidationError(f"Manifest can't contain more than {ProductBulkCreator.MAX_PRODUCTS} rows")
+        return rows
+
+    def validate_files(self, value):
+        names = [file.name for file in value]
+        if len(names) != len(set(names)):
+            raise serializers.ValidationError("File names must be unique")
+        return value
+
+    def get_rows(self) -> list[tuple[ProductBulkCreator.Item | None, dict | None]]:
+        """
+        Проверяет строки манифеста. Категории загружаются одним запросом
+        :return: (элемент для ProductBulkCreator, None) или (None, ошибки строки) для каждой строки
+        """
+        rows = self.validated_data["manifest"]
+        category_ids = set()
+        for row in rows:
+            try:
+                category_ids.add(int(row.get("category")))
+            except (TypeError, ValueError):
+                pass
+
+        context = {
+            "categories": Category.objects.in_bulk(category_ids),
+            "files": {file.name: file for file in self.validated_data["files"]},
+            "used_files": set(),
+        }
+
+        result = []
+        for row in rows:
+            row_serializer = ProductImportRowSerializer(data=row, context=context)
+            if row_serializer.is_valid():
+                result.append((ProductBulkCreator.Item(**row_serializer.validated_data), None))
+            else:
+                result.append((None, row_serializer.errors))
+        return result
+
+
+class ProductImportResultSerializer(serializers.Serializer):
+    row = serializers.IntegerField(read_only=True)
+    """
+    Номер строки манифеста, начиная с 1
+    """
+    product_id = serializers.IntegerField(read_only=True, allow_null=True)
+    created = serializers.BooleanField(read_only=True)
+    file_stored = serializers.BooleanField(read_only=True)
+    errors = serializers.DictField(read_only=True, allow_null=True)
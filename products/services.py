@@ -1,17 +1,26 @@
 from datetime import datetime, timedelta
-import random
+import decimal
 from seller.models import Seller
-from .models import Product, Category
-from users.models import User
+from .models import Product, Category, SupportCode
+from users.models import User, BalanceEntry
+from users.services import BalanceLedger
 from django.db import transaction
 import os.path
 from django.db.models.fields.files import FieldFile
-from typing import List
+from django.core.files.uploadedfile import UploadedFile
+from typing import List, Iterable
+from django.db.models import F, Q, OuterRef, Subquery, Count
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.utils import timezone
+from django.urls import reverse
 import traceback
-from seller.services import SellerEconomyService, get_or_create_seller
-from analytics.services import GoogleSheetsWriter
+from dataclasses import dataclass
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from seller.services import SellerEconomyService, SellerStatsService, SalesRollupService, get_or_create_seller
+from analytics.services import PurchaseLogOutbox
+from utils.transactions import retry_on_serialization_failure
 
 
 class ProductBuyer:
@@ -19,7 +28,10 @@ class ProductBuyer:
     Сервисный объект для покупки товара пользователем.
     buy() выполняется с уровнем изоляции Serializeable, чтобы избежать аномалий.
     Конструктор принимает ID и загружает объекты внутри, чтобы они отслеживались транзакцией с нужным уровнем изоляции
+    Запись в Google Sheets добавляется в outbox в той же транзакции и отправляется в фоне (см. PurchaseLogOutbox)
     """
+    DATABASE = "serializeable"
+
     product_id: int
     user_id: str
 
@@ -39,30 +51,50 @@ class ProductBuyer:
     class NoFileError(Exception):
         pass
 
+    class ReservedError(Exception):
+        """
+        Товар зарезервирован другим покупателем
+        """
+        pass
+
+    class NotReservedError(Exception):
+        """
+        У покупателя нет действующего резерва товара (см. ProductReserver)
+        """
+        pass
+
     def __init__(self, product_id: int, user_id: str):
         self.product_id = product_id
         self.user_id = user_id
 
+    @retry_on_serialization_failure("ProductBuyer.buy", using=DATABASE)
     def buy(self):
-        with transaction.atomic(using="serializeable"):
+        with transaction.atomic(using=self.DATABASE):
             self.__load_entities()
             self.__assert_can_buy()
+            was_counted = CategoryCounterService.is_counted(self.product)
 
             self.product.purchased_by = self.user
             self.product.purchased_at = timezone.now()
-            self.user.balance -= self.product.price
-
             ProductSupportService(self.product).assign_support_code(commit=False)
+            ProductReserver.clear_reservation(self.product)
+            BalanceLedger.debit(self.user, self.product.price, BalanceEntry.KIND_PURCHASE,
+                                f"product:{self.product.id}", using=self.DATABASE)
+            CategoryCounterService.on_product_changed(self.product, was_counted, using=self.DATABASE)
+
             SellerEconomyService(self.seller).on_product_purchased(self.product, commit=False)
-            GoogleSheetsWriter().log_purchase(self.product)
+            SellerStatsService(self.seller).on_product_purchased(self.product)
+            SalesRollupService.record([(self.product, self.seller)], using=self.DATABASE)
+            PurchaseLogOutbox.add(self.product, using=self.DATABASE)
 
             self.product.save()
-            self.user.save()
             self.seller.save()
 
     def __load_entities(self):
-        self.product = Product.objects.get(id=self.product_id)
-        self.user = User.objects.get(id=self.user_id)
+        # явный using, иначе запросы выполняются через default вне транзакции.
+        # связанные объекты (product.seller, seller.seller) загружаются через ту же БД
+        self.product = Product.objects.using(self.DATABASE).get(id=self.product_id)
+        self.user = User.objects.using(self.DATABASE).get(id=self.user_id)
         self.seller = get_or_create_seller(self.product.seller)
 
     def __assert_can_buy(self):
@@ -75,10 +107,270 @@ class ProductBuyer:
         if self.product.purchased_by:
             raise self.AlreadyBoughtError
 
-        if self.user.balance < self.product.price:
+        if ProductReserver.is_reserved_by_other(self.product, self.user):
+            raise self.ReservedError
+
+        # покупаются только товары, зарезервированные покупателем: конкуренция за товар решается при резервировании
+        if not ProductReserver.is_reserved_by(self.product, self.user):
+            raise self.NotReservedError
+
+        if BalanceLedger.get_balance(self.user, using=self.DATABASE) < self.product.price:
             raise self.InsufficientBalanceError
 
 
+class ProductCartBuyer:
+    """
+    Покупка нескольких товаров одним запросом. Каждый товар должен быть зарезервирован покупателем (см. ProductReserver).
+    Все товары блокируются и проверяются в одной Serializeable транзакции, баланс покупателя списывается один раз,
+    каждый селлер обновляется один раз, строки Google Sheets добавляются в outbox одним INSERT.
+    Товары, которые нельзя купить, пропускаются, причина возвращается в результате по каждому товару
+    """
+    DATABASE = "serializeable"
+    MAX_PRODUCTS = 100
+
+    product_ids: List[int]
+    user_id: str
+
+    @dataclass
+    class ItemResult:
+        product_id: int
+        error: str | None = None
+        """
+        Код ошибки, если товар не куплен: not_found, no_file, buying_by_seller, already_bought, reserved, not_reserved, insufficient_balance
+        """
+
+        @property
+        def purchased(self) -> bool:
+            return self.error is None
+
+    class TooManyProductsError(Exception):
+        pass
+
+    def __init__(self, product_ids: Iterable[int], user_id: str):
+        # повторяющиеся ID учитываются один раз, порядок сохраняется
+        self.product_ids = list(dict.fromkeys(product_ids))
+        self.user_id = user_id
+
+        if len(self.product_ids) > self.MAX_PRODUCTS:
+            raise self.TooManyProductsError
+
+    @retry_on_serialization_failure("ProductCartBuyer.buy", using=DATABASE)
+    def buy(self) -> List[ItemResult]:
+        with transaction.atomic(using=self.DATABASE):
+            user = User.objects.using(self.DATABASE).get(id=self.user_id)
+            # блокировка в порядке id, чтобы параллельные корзины с общими товарами не взаимоблокировались
+            products = {product.id: product for product in
+                        Product.objects.using(self.DATABASE)
+                        .select_for_update(of=("self",))
+                        .select_related("seller__seller", "category")
+                        .filter(id__in=self.product_ids)
+                        .order_by("id")}
+
+            now = timezone.now()
+            balance = BalanceLedger.get_balance(user, using=self.DATABASE)
+            results = []
+            purchased = []
+            for product_id in self.product_ids:
+                product = products.get(product_id)
+                error = self.__get_error(product, user, balance)
+                results.append(self.ItemResult(product_id, error))
+                if error:
+                    continue
+
+                was_counted = CategoryCounterService.is_counted(product)
+                product.purchased_by = user
+                product.purchased_at = now
+                ProductReserver.clear_reservation(product)
+                balance -= product.price
+                CategoryCounterService.on_product_changed(product, was_counted, using=self.DATABASE)
+                purchased.append(product)
+
+            if purchased:
+                self.__complete_purchase(purchased, user)
+
+        return results
+
+    def __complete_purchase(self, products: List[Product], user: User):
+        ProductSupportService.assign_support_codes(products)
+
+        sellers: dict[str, Seller] = {}
+        for product in products:
+            # один объект Seller на селлера, чтобы начисления суммировались и сохранялись одним запросом
+            if product.seller_id not in sellers:
+                sellers[product.seller_id] = get_or_create_seller(product.seller)
+            seller = sellers[product.seller_id]
+            product.seller.seller = seller
+            SellerEconomyService(seller).on_product_purchased(product, commit=False)
+            SellerStatsService(seller).on_product_purchased(product)
+
+        SalesRollupService.record([(product, sellers[product.seller_id]) for product in products], using=self.DATABASE)
+        PurchaseLogOutbox.add_many(products, using=self.DATABASE)
+        BalanceLedger.add_entries([BalanceEntry(user_id=user.id, amount=-product.price, kind=BalanceEntry.KIND_PURCHASE,
+                                                reference=f"product:{product.id}") for product in products],
+                                  using=self.DATABASE)
+
+        Product.objects.using(self.DATABASE).bulk_update(products, ["purchased_by", "purchased_at", "support_code",
+                                                                "reserved_by", "reserved_until"])
+        for seller in sellers.values():
+            seller.save()
+
+    def __get_error(self, product: Product | None, user: User, balance: decimal.Decimal) -> str | None:
+        if product is None:
+            return "not_found"
+
+        if not ProductFileManager(product).has_file():
+            return "no_file"
+
+        if product.seller_id == user.id:
+            return "buying_by_seller"
+
+        if product.purchased_by_id:
+            return "already_bought"
+
+        if ProductReserver.is_reserved_by_other(product, user):
+            return "reserved"
+
+        if not ProductReserver.is_reserved_by(product, user):
+            return "not_reserved"
+
+        if balance < product.price:
+            return "insufficient_balance"
+
+        return None
+
+
+class ProductReserver:
+    """
+    Временное закрепление товара за покупателем перед покупкой (settings.PRODUCT_RESERVATION_TTL).
+    Резерв захватывается одним условным UPDATE без Serializeable транзакции, поэтому при конкуренции за товар
+    только один покупатель доходит до ProductBuyer, остальные сразу получают отказ.
+    Зарезервированный товар скрыт из Product.available и не учитывается в счетчике категории.
+    Истекшие резервы снимаются пачками ProductReservationSweeper
+    """
+    MAX_ACTIVE_RESERVATIONS = 10
+    """
+    Максимальное количество одновременно зарезервированных пользователем товаров
+    """
+
+    product: Product
+    user: User
+
+    class NotAvailableError(Exception):
+        """
+        Товар куплен, не имеет файла или зарезервирован другим покупателем
+        """
+        pass
+
+    class BuyingBySellerError(Exception):
+        pass
+
+    class TooManyReservationsError(Exception):
+        pass
+
+    def __init__(self, product: Product, user: User):
+        self.product = product
+        self.user = user
+
+    @staticmethod
+    def is_reserved_by_other(product: Product, user: User) -> bool:
+        return (product.reserved_by_id is not None
+                and product.reserved_by_id != user.id
+                and product.reserved_until > timezone.now())
+
+    @staticmethod
+    def is_reserved_by(product: Product, user: User) -> bool:
+        """
+        :return: True, если у user есть действующий резерв товара
+        """
+        return (product.reserved_by_id == user.id
+                and product.reserved_until is not None
+                and product.reserved_until > timezone.now())
+
+    @staticmethod
+    def clear_reservation(product: Product):
+        product.reserved_by = None
+        product.reserved_until = None
+
+    def reserve(self) -> datetime:
+        """
+        Резервирует товар или продлевает резерв пользователя
+        :return: Время окончания резерва
+        """
+        if self.product.seller_id == self.user.id:
+            raise self.BuyingBySellerError
+
+        now = timezone.now()
+        reserved_until = now + settings.PRODUCT_RESERVATION_TTL
+
+        active_count = (Product.objects.filter(reserved_by=self.user, reserved_until__gt=now)
+                        .exclude(id=self.product.id).count())
+        if active_count >= self.MAX_ACTIVE_RESERVATIONS:
+            raise self.TooManyReservationsError
+
+        with transaction.atomic():
+            products = Product.objects.filter(id=self.product.id, purchased_by=None, file_present=True)
+            # свободный товар перестает учитываться в счетчике категории
+            if products.filter(reserved_by=None).update(reserved_by=self.user, reserved_until=reserved_until):
+                CategoryCounterService.adjust(self.product.category_id, -1)
+            # продление своего резерва или перехват истекшего, который еще не снят. Счетчик не меняется
+            elif not (products.filter(Q(reserved_by=self.user) | Q(reserved_until__lte=now))
+                      .update(reserved_by=self.user, reserved_until=reserved_until)):
+                raise self.NotAvailableError
+
+        self.product.reserved_by = self.user
+        self.product.reserved_until = reserved_until
+        return reserved_until
+
+    def release(self) -> bool:
+        """
+        Снимает резерв пользователя с товара
+        :return: False, если товар не был зарезервирован пользователем
+        """
+        with transaction.atomic():
+            released = (Product.objects.filter(id=self.product.id, reserved_by=self.user, purchased_by=None)
+                        .update(reserved_by=None, reserved_until=None))
+            if released and self.product.file_present:
+                CategoryCounterService.adjust(self.product.category_id, 1)
+
+        if released:
+            self.clear_reservation(self.product)
+        return bool(released)
+
+
+class ProductReservationSweeper:
+    BATCH_SIZE = 1000
+
+    @classmethod
+    def release_expired(cls, batch_size: int = BATCH_SIZE) -> int:
+        """
+        Снимает истекшие резервы пачками. Строки блокируются с SKIP LOCKED, чтобы не ждать идущие покупки
+        :return: Количество снятых резервов
+        """
+        now = timezone.now()
+        total = 0
+        while True:
+            with transaction.atomic():
+                rows = list(Product.objects
+                            .select_for_update(skip_locked=True)
+                            .filter(reserved_by__isnull=False, reserved_until__lte=now)
+                            .values_list("id", "category_id", "purchased_by_id", "file_present")[:batch_size])
+                if not rows:
+                    break
+
+                Product.objects.filter(id__in=[row[0] for row in rows]).update(reserved_by=None, reserved_until=None)
+
+                released = Counter(category_id for _, category_id, purchased_by_id, file_present in rows
+                                   if purchased_by_id is None and file_present)
+                for category_id, count in released.items():
+                    CategoryCounterService.adjust(category_id, count)
+
+            total += len(rows)
+            if len(rows) < batch_size:
+                break
+
+        return total
+
+
 class ProductAccessManager:
     product: Product
     user: User
@@ -132,6 +424,12 @@ class ProductAccessManager:
 
 class ProductFileManager:
     ALLOWED_EXTENSIONS = {'.zip', '.rar', '.7z'}
+    CONTENT_TYPES = {
+        '.zip': 'application/zip',
+        '.rar': 'application/vnd.rar',
+        '.7z': 'application/x-7z-compressed',
+    }
+    DEFAULT_CONTENT_TYPE = 'application/octet-stream'
     MAX_FILE_SIZE_BYTES = 1024 * 1024 * 10    # 10 МБ
     UPLOAD_PREFIX = "upload__"
 
@@ -206,22 +504,64 @@ class ProductFileManager:
             return splitted[1]
         return splitted[0]
 
+    @classmethod
+    def get_content_type(cls, filename: str) -> str:
+        path, ext = os.path.splitext(filename)
+        return cls.CONTENT_TYPES.get(ext.lower(), cls.DEFAULT_CONTENT_TYPE)
+
     def has_file(self):
-        return bool(self.product.file) and self.product.file.storage.exists(self.product.file.name)
+        """
+        Проверка выполняется по сохраненному флагу Product.file_present без обращения к хранилищу.
+        Расхождения с хранилищем исправляет ProductFileReconciler
+        """
+        return self.product.file_present and bool(self.product.file)
+
+    @staticmethod
+    def get_download_urls(products: Iterable[Product]) -> dict[int, str]:
+        """
+        URL скачивания для нескольких товаров. URL разрешается один раз, ID товаров подставляются в полученный шаблон
+        :return: {ID товара: URL}
+        """
+        template = reverse("product-download", kwargs={"pk": "__pk__"})
+        return {product.id: template.replace("__pk__", str(product.id)) for product in products}
+
+    def get_file_size(self) -> int:
+        if self.product.file_size is None:
+            return self.product.file.size
+        return self.product.file_size
+
+    def get_file_updated_at(self) -> datetime:
+        if self.product.file_updated_at is None:
+            return self.product.file.storage.get_modified_time(self.product.file.name)
+        return self.product.file_updated_at
+
+    def __set_file_metadata(self, size: int | None, content_type: str):
+        self.product.file_present = size is not None
+        self.product.file_size = size
+        self.product.file_content_type = content_type
+        self.product.file_updated_at = timezone.now() if size is not None else None
 
     def update_file(self, new_file: FieldFile | None, commit=True, bypass_validation=False, allow_delete=True):
         if not bypass_validation:
             self.validate_file(new_file, allow_delete=allow_delete)
 
+        was_counted = CategoryCounterService.is_counted(self.product)
+
         # удаление файла товара
         if not new_file:
+            had_file = bool(self.product.file) or self.product.file_present
             if self.product.file:
-                self.product.file.delete(save=commit)
+                self.product.file.delete(save=False)
                 self.product.file = None
+            self.__set_file_metadata(None, '')
+            CategoryCounterService.on_product_changed(self.product, was_counted)
+
+            if commit and had_file:
+                self.product.save()
             return
 
         new_file_orig_name = new_file.name
-        new_file.name = self.__get_filename_for_storage(new_file.name)
+        new_file.name = self.get_filename_for_storage(new_file.name)
 
         # если расширение нового и старого файла не совпадает, то создастся новый файл, а старый не удалится, поэтому удаляем явно
         if self.product.file and self.product.file.name != new_file.name:
@@ -235,12 +575,44 @@ class ProductFileManager:
             if not self.product.file and new_file.storage.exists(new_file_orig_name):
                 new_file.storage.delete(new_file_orig_name)
 
+        # StoredProductFile (ProductFileUploadHandler) переносится хранилищем под итоговое имя при сохранении товара
         self.product.file = new_file
+        self.__set_file_metadata(new_file.size, self.get_content_type(new_file.name))
+        CategoryCounterService.on_product_changed(self.product, was_counted)
 
         if commit:
             self.product.save()
 
-    def __get_filename_for_storage(self, original_name: str):
+    @classmethod
+    def store_new_files(cls, items: Iterable[tuple[Product, UploadedFile]]) -> dict[int, str]:
+        """
+        Сохраняет файлы товаров, у которых еще нет файла, и обновляет товары одним запросом.
+        Файлы должны быть проверены validate_file. Счетчики категорий изменяются одним UPDATE на категорию
+        :return: {ID товара: ошибка} для файлов, которые не удалось сохранить
+        """
+        stored = []
+        errors = {}
+        counters = Counter()
+        for product, file in items:
+            manager = cls(product)
+            try:
+                product.file.save(manager.get_filename_for_storage(file.name), file, save=False)
+            except OSError as e:
+                errors[product.id] = str(e)
+                continue
+
+            manager.__set_file_metadata(file.size, cls.get_content_type(product.file.name))
+            if CategoryCounterService.is_counted(product):
+                counters[product.category_id] += 1
+            stored.append(product)
+
+        Product.objects.bulk_update(stored, ["file", "file_present", "file_size", "file_content_type", "file_updated_at"],
+                                    batch_size=500)
+        for category_id, delta in counters.items():
+            CategoryCounterService.adjust(category_id, delta)
+        return errors
+
+    def get_filename_for_storage(self, original_name: str):
         """
         Возвращает имя файла продукта, под которым он будет храниться в хранилище (на диске)
         :return: <id продукта>__<название оригинального файла>.<расширение оригинального файла>
@@ -263,34 +635,127 @@ class ProductFileManager:
 
 
 class ProductFileCleaner:
+    BATCH_SIZE = 500
+    DELETE_WORKERS = 8
+    """
+    Количество потоков для параллельного удаления файлов из хранилища
+    """
+
     def __init__(self):
         pass
 
-    @staticmethod
-    def prune_outdated_files() -> List[str]:
+    @classmethod
+    def prune_outdated_files(cls, batch_size: int = BATCH_SIZE) -> List[str]:
         """
-        Удаляет файлы для всех продуктов, купленых более settings.PRODUCT_FILE_MAX_AGE времени назад
+        Удаляет файлы для всех продуктов, купленых более settings.PRODUCT_FILE_MAX_AGE времени назад.
+        Товары выбираются пачками по (purchased_at, id), файлы пачки удаляются параллельно,
+        метаданные файлов очищаются одним UPDATE на пачку.
+        Блокировку от одновременного запуска в нескольких репликах обеспечивает вызывающий код (см. utils.locks.advisory_lock)
         :return: Список названий удаленных файлов
         """
 
         expired = timezone.now() - settings.PRODUCT_FILE_MAX_AGE
-        products = Product.objects.filter(file__isnull=False).exclude(file__exact='').filter(purchased_at__lte=expired)
+        products = (Product.objects
+                    .filter(file__isnull=False).exclude(file__exact='')
+                    .filter(purchased_at__lte=expired)
+                    .order_by("purchased_at", "id"))
 
         result = []
-        for product in products:
+        last_position = None
+        while True:
+            batch = products
+            if last_position is not None:
+                purchased_at, product_id = last_position
+                batch = batch.filter(Q(purchased_at__gt=purchased_at) | Q(purchased_at=purchased_at, id__gt=product_id))
+            batch = list(batch.values_list("id", "file", "purchased_at")[:batch_size])
+            if not batch:
+                break
+            last_position = (batch[-1][2], batch[-1][0])
+
+            deleted = cls.__delete_files({product_id: name for product_id, name, _ in batch})
+            Product.objects.filter(id__in=deleted.keys()).update(file=None, file_present=False, file_size=None,
+                                                                 file_content_type='', file_updated_at=None)
+            for product_id, name in deleted.items():
+                print(f"[PRUNE] Deleted file {name} of product {product_id}")
+            result.extend(deleted.values())
+
+        return result
+
+    @classmethod
+    def __delete_files(cls, files: dict[int, str]) -> dict[int, str]:
+        """
+        :param files: ID товара -> название файла в хранилище
+        :return: Файлы, которые удалось удалить
+        """
+        storage = Product.file.field.storage
+
+        def delete(name: str) -> bool:
             try:
-                deleted_file = product.file.name
-                ProductFileManager(product).update_file(None)
-                result.append(deleted_file)
-                print(f"[PRUNE] Deleted file {deleted_file} of product {product}")
-            except:
+                storage.delete(name)
+                return True
+            except Exception:
                 traceback.print_exc()
-        return result
+                return False
+
+        with ThreadPoolExecutor(max_workers=cls.DELETE_WORKERS) as executor:
+            results = executor.map(delete, files.values())
+            return {product_id: name for (product_id, name), success in zip(files.items(), results) if success}
+
+
+class ProductFileReconciler:
+    """
+    Сверяет сохраненные метаданные файлов (Product.file_present, file_size, file_content_type) с хранилищем
+    """
+    BATCH_SIZE = 500
+
+    @classmethod
+    def reconcile(cls, batch_size: int = BATCH_SIZE) -> List[int]:
+        """
+        Проверяет наличие и размер файлов всех товаров, у которых указан файл или установлен флаг наличия.
+        :return: ID исправленных товаров
+        """
+        products = (Product.objects
+                    .filter(~Q(file__isnull=True) & ~Q(file__exact='') | Q(file_present=True))
+                    .only("id", "category_id", "purchased_by_id", "file", "file_present", "file_size", "file_content_type", "file_updated_at")
+                    .order_by("id"))
+
+        fixed: List[Product] = []
+        for product in products.iterator(chunk_size=batch_size):
+            if cls.__reconcile_product(product):
+                fixed.append(product)
+
+        Product.objects.bulk_update(fixed, ["file_present", "file_size", "file_content_type", "file_updated_at"], batch_size=batch_size)
+        CategoryCounterService.recount({product.category_id for product in fixed})
+        return [product.id for product in fixed]
+
+    @staticmethod
+    def __reconcile_product(product: Product) -> bool:
+        """
+        Обновляет метаданные в объекте без сохранения
+        :return: True, если метаданные отличались от хранилища
+        """
+        present = bool(product.file) and product.file.storage.exists(product.file.name)
+        size = product.file.storage.size(product.file.name) if present else None
+        content_type = ProductFileManager.get_content_type(product.file.name) if present else ''
+        updated_at = None
+        if present:
+            updated_at = product.file_updated_at or product.file.storage.get_modified_time(product.file.name)
+
+        if (product.file_present, product.file_size, product.file_content_type, product.file_updated_at) == (present, size, content_type, updated_at):
+            return False
+
+        print(f"[RECONCILE] Product {product.id}: present={product.file_present}->{present}, size={product.file_size}->{size}")
+        product.file_present = present
+        product.file_size = size
+        product.file_content_type = content_type
+        product.file_updated_at = updated_at
+        return True
 
 
 class ProductCreator:
     """
-    Сервис не проверяет валидность полей, кроме seller. Валидаторы должны быть вызваны из .validators ранее
+    Сервис не проверяет валидность полей, кроме seller. Валидаторы должны быть вызваны из .validators ранее,
+    файл должен быть проверен ProductFileManager.validate_file
     """
 
     class InvalidSellerError(Exception):
@@ -304,8 +769,10 @@ class ProductCreator:
     score: str
     produced_at: datetime
     price: float
+    file: UploadedFile | None
 
-    def __init__(self, seller: User, description: str, category: Category, number: str, score: str, produced_at: datetime, price: float):
+    def __init__(self, seller: User, description: str, category: Category, number: str, score: str, produced_at: datetime, price: float,
+                 file: UploadedFile | None = None):
         self.seller = seller
         self.description = description
         self.category = category
@@ -313,13 +780,31 @@ class ProductCreator:
         self.score = score
         self.produced_at = produced_at
         self.price = price
+        self.file = file
 
     def create(self) -> Product:
+        """
+        Товар и его файл сохраняются в одной транзакции: файлу нужен ID товара (<id>__<имя>), поэтому товар сначала
+        добавляется без файла, и товар не бывает виден без файла другим запросам.
+        Если транзакция не завершилась, сохраненный файл удаляется
+        """
         self.assert_seller_valid()
 
         product = Product(seller=self.seller, description=self.description, category=self.category,
                           number=self.number, score=self.score, produced_at=self.produced_at, price=self.price)
-        product.save()
+        try:
+            with transaction.atomic():
+                product.save()
+                SellerStatsService.adjust_on_sale(self.seller.id, 1, product.price)
+                if self.file is not None:
+                    # счетчик категории изменяется внутри update_file после коммита
+                    ProductFileManager(product).update_file(self.file, commit=True, bypass_validation=True)
+                else:
+                    CategoryCounterService.on_product_changed(product, was_counted=False)
+        except Exception:
+            if product.file:
+                product.file.delete(save=False)
+            raise
         return product
 
     def assert_seller_valid(self):
@@ -327,6 +812,68 @@ class ProductCreator:
             raise self.InvalidSellerError("User is not a seller")
 
 
+class ProductBulkCreator:
+    """
+    Создание нескольких товаров селлера одним запросом: товары добавляются одним INSERT, файлы сохраняются в хранилище
+    после коммита и записываются в товары одним UPDATE (см. ProductFileManager.store_new_files).
+    Сервис не проверяет валидность полей, кроме seller. Валидаторы должны быть вызваны из .validators ранее
+    """
+    MAX_PRODUCTS = 100
+    """
+    Вместе с манифестом должно укладываться в settings.DATA_UPLOAD_MAX_NUMBER_FILES
+    """
+    MAX_TOTAL_FILE_SIZE_BYTES = 1024 * 1024 * 100    # 100 МБ
+
+    @dataclass
+    class Item:
+        description: str
+        category: Category
+        number: str
+        score: str
+        produced_at: datetime
+        price: decimal.Decimal
+        file: UploadedFile | None = None
+
+    class TooManyProductsError(Exception):
+        pass
+
+    class FilesTooLargeError(Exception):
+        pass
+
+    seller: User
+    items: List[Item]
+
+    def __init__(self, seller: User, items: Iterable[Item]):
+        self.seller = seller
+        self.items = list(items)
+
+        if len(self.items) > self.MAX_PRODUCTS:
+            raise self.TooManyProductsError
+        if sum(item.file.size for item in self.items if item.file) > self.MAX_TOTAL_FILE_SIZE_BYTES:
+            raise self.FilesTooLargeError
+
+    def create(self) -> tuple[List[Product], dict[int, str]]:
+        """
+        :return: Созданные товары в порядке items и {ID товара: ошибка} для файлов, которые не удалось сохранить
+        """
+        if not self.seller.is_seller:
+            raise ProductCreator.InvalidSellerError("User is not a seller")
+
+        products = [Product(seller=self.seller, description=item.description, category=item.category,
+                            number=item.number, score=item.score, produced_at=item.produced_at, price=item.price)
+                    for item in self.items]
+        if not products:
+            return products, {}
+
+        with transaction.atomic():
+            Product.objects.bulk_create(products)
+            SellerStatsService.adjust_on_sale(self.seller.id, len(products), sum(product.price for product in products))
+
+        # товары без файла не учитываются в счетчиках категорий, поэтому счетчики изменяются только при сохранении файлов
+        file_errors = ProductFileManager.store_new_files((product, item.file) for product, item in zip(products, self.items) if item.file)
+        return products, file_errors
+
+
 class ProductDeleter:
     product: Product
 
@@ -343,7 +890,9 @@ class ProductDeleter:
         # на всякий случай явно удаляем файл
         ProductFileManager(self.product).update_file(None, commit=True, bypass_validation=True)
 
-        self.product.delete()
+        with transaction.atomic():
+            self.product.delete()
+            SellerStatsService.adjust_on_sale(self.product.seller_id, -1, -self.product.price)
 
     def assert_can_be_deleted(self):
         if self.product.purchased_by:
@@ -351,12 +900,14 @@ class ProductDeleter:
 
 
 class ProductSupportService:
-    ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-    CODE_LENGTH = 4
     SUPPORT_PERIOD = timedelta(days=1)
     """
     Период после покупки товара, в течение которого пользователь может обратиться в поддержку
     """
+    DATABASE = "default"
+    """
+    БД пула кодов поддержки. Уровень изоляции по умолчанию (READ COMMITTED), см. assign_support_codes
+    """
 
     product: Product
 
@@ -364,6 +915,9 @@ class ProductSupportService:
         pass
 
     class CodeGenerationError(Exception):
+        """
+        В пуле SupportCode нет свободных кодов
+        """
         pass
 
     def __init__(self, product: Product):
@@ -373,6 +927,13 @@ class ProductSupportService:
     def query_by_support_code(code: str):
         return Product.objects.filter(support_code=code).order_by("-purchased_at")[:1]
 
+    @classmethod
+    def get_support_period_start(cls) -> datetime:
+        """
+        :return: Товары, купленные раньше этого момента, вне периода поддержки
+        """
+        return timezone.now() - cls.SUPPORT_PERIOD
+
     def is_support_period_expired(self) -> bool:
         # товар еще не куплен
         if self.product.purchased_at is None:
@@ -382,35 +943,95 @@ class ProductSupportService:
         return (timezone.now() - self.product.purchased_at) > self.SUPPORT_PERIOD
 
     def assign_support_code(self, commit: bool = True):
-        attempts = 5
-        for _ in range(attempts):
-            code = self.__generate_code()
-
-            # если код занят, то генерируем заново
-            if not self.__is_code_available(code):
-                continue
+        """
+        Выдает товару свободный код из пула SupportCode. Код блокируется до окончания периода поддержки товара,
+        после чего автоматически становится доступным для следующих покупок.
+        Код выдается в отдельной короткой транзакции (см. assign_support_codes): если покупка откатится,
+        код не вернется в пул сразу, а освободится по истечении периода поддержки
+        """
+        self.assign_support_codes([self.product])
+        if commit:
+            self.product.save()
 
-            self.product.support_code = code
-            if commit:
-                self.product.save()
+    @classmethod
+    def assign_support_codes(cls, products: List[Product]):
+        """
+        Выдает коды нескольким товарам одним запросом к пулу. Товары не сохраняются.
+        Пул читается и изменяется в собственной транзакции READ COMMITTED через DATABASE, а не в Serializeable транзакции покупки:
+        все покупки берут самые старые строки одного диапазона available_at, поэтому в Serializeable транзакциях
+        покупки разных товаров конфликтовали бы между собой
+        """
+        if not products:
             return
 
-        # с attempts попыток не удалось получить свободный код
-        raise self.CodeGenerationError()
+        now = timezone.now()
+
+        with transaction.atomic(using=cls.DATABASE):
+            # skip_locked: параллельные покупки получают разные коды, не ожидая друг друга.
+            # строки, выданные уже зафиксированными покупками, не проходят условие available_at <= now
+            support_codes = list(SupportCode.objects.using(cls.DATABASE)
+                                 .select_for_update(skip_locked=True)
+                                 .filter(available_at__lte=now)
+                                 .order_by("available_at")[:len(products)])
+            # все коды заняты товарами, период поддержки которых не истек
+            if len(support_codes) < len(products):
+                raise cls.CodeGenerationError()
 
-    def __generate_code(self) -> str:
+            for product, support_code in zip(products, support_codes):
+                support_code.available_at = (product.purchased_at or now) + cls.SUPPORT_PERIOD
+                product.support_code = support_code.code
+            SupportCode.objects.using(cls.DATABASE).bulk_update(support_codes, ["available_at"])
+
+
+class CategoryCounterService:
+    """
+    Поддерживает Category.available_products_count в актуальном состоянии.
+    Счетчик изменяется атомарным UPDATE после коммита транзакции, в которой изменилась доступность товара,
+    поэтому строка категории не попадает в Serializeable транзакции покупки и не вызывает конфликтов между покупателями.
+    Возможный рассинхрон исправляется командой rebuild_category_counters
+    """
+
+    @staticmethod
+    def is_counted(product: Product) -> bool:
         """
-        :return: Строка из CODE_LENGTH заглавных лат. букв или цифр (ALPHABET)
+        :return: True, если товар учитывается в счетчике доступных товаров категории (условие совпадает с Product.available)
         """
-        indexes = [random.randint(0, len(self.ALPHABET) - 1) for _ in range(self.CODE_LENGTH)]
-        return "".join(self.ALPHABET[index] for index in indexes)
+        return (product.purchased_by_id is None
+                and product.reserved_by_id is None
+                and ProductFileManager(product).has_file())
 
-    def __is_code_available(self, code: str) -> bool:
-        product_query = self.query_by_support_code(code)
+    @classmethod
+    def adjust(cls, category_id: int, delta: int, using: str = "default"):
+        """
+        Изменяет счетчик категории на delta после коммита текущей транзакции БД using.
+        Вне транзакции изменение применяется сразу
+        """
+        if not delta:
+            return
 
-        # нет товаров с таким support_code
-        if not any(product_query):
-            return True
+        transaction.on_commit(
+            lambda: Category.objects.filter(id=category_id).update(available_products_count=F("available_products_count") + delta),
+            using=using
+        )
+
+    @classmethod
+    def on_product_changed(cls, product: Product, was_counted: bool, using: str = "default"):
+        cls.adjust(product.category_id, int(cls.is_counted(product)) - int(was_counted), using=using)
+
+    @classmethod
+    def recount(cls, category_ids: Iterable[int] | None = None):
+        """
+        Пересчитывает счетчики по таблице товаров.
+        :param category_ids: ID категорий для пересчета; None - все категории
+        """
+        available_count = (Product.available.filter(category=OuterRef("pk"))
+                           .order_by()
+                           .values("category")
+                           .annotate(count=Count("id"))
+                           .values("count"))
+
+        categories = Category.objects.all()
+        if category_ids is not None:
+            categories = categories.filter(id__in=list(category_ids))
 
-        # True, если поддержка для товара с таким кодом уже закончилась
-        return ProductSupportService(product_query[0]).is_support_period_expired()
+        return categories.update(available_products_count=Coalesce(Subquery(available_count), 0))
@@ -0,0 +1,94 @@
+import shutil
+import tempfile
+from unittest import mock
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import User
+from .models import Product, Category
+from .services import ProductFileManager
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+FILE_CONTENT = b"0123456789" * 10
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, FILE_DOWNLOAD_OFFLOAD="", FILE_DOWNLOAD_ACCEL_PREFIX="/protected-media/")
+class ProductDownloadTests(TestCase):
+    """
+    Скачивание файла товара: при FILE_DOWNLOAD_OFFLOAD="nginx" воркер не читает файл и отдает пустой ответ
+    с X-Accel-Redirect, без отдачи через прокси работают условные запросы и Range
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        seller = User.objects.create(username="seller", is_seller=True)
+        self.buyer = User.objects.create(username="buyer")
+        category = Category.objects.create(name="category")
+
+        self.product = Product.objects.create(seller=seller, category=category, description="product", number="1",
+                                              score="A", price=1, produced_at=timezone.now())
+        ProductFileManager(self.product).update_file(SimpleUploadedFile("archive.zip", FILE_CONTENT))
+        self.product.purchased_by = self.buyer
+        self.product.purchased_at = timezone.now()
+        self.product.save()
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+        self.url = reverse("product-download", kwargs={"pk": self.product.id})
+
+    @override_settings(FILE_DOWNLOAD_OFFLOAD="nginx")
+    def test_offloaded_download_does_not_open_file(self):
+        with mock.patch.object(FileSystemStorage, "open") as storage_open:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + self.product.file.name)
+        self.assertEqual(response.content, b"")
+        self.assertIn('filename="archive.zip"', response["Content-Disposition"])
+        storage_open.assert_not_called()
+
+    @override_settings(FILE_DOWNLOAD_OFFLOAD="nginx")
+    def test_offloaded_download_checks_access(self):
+        self.client.force_authenticate(User.objects.create(username="other"))
+
+        with mock.patch.object(FileSystemStorage, "open") as storage_open:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn("X-Accel-Redirect", response)
+        storage_open.assert_not_called()
+
+    def test_download(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Accel-Redirect", response)
+        self.assertEqual(b"".join(response.streaming_content), FILE_CONTENT)
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        with mock.patch.object(FileSystemStorage, "open") as storage_open:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        storage_open.assert_not_called()
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(FILE_CONTENT)}")
+        self.assertEqual(b"".join(response.streaming_content), FILE_CONTENT[10:20])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(FILE_CONTENT)}-")
+
+        self.assertEqual(response.status_code, 416)
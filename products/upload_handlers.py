@@ -0,0 +1,116 @@
+import os
+import uuid
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from .models import Product
+from .services import ProductFileManager
+
+
+class StoredProductFile(UploadedFile):
+    """
+    Загруженный файл во временном файле в хранилище товаров (ProductFileUploadHandler).
+    Как и TemporaryUploadedFile, переносится под итоговое имя только при сохранении товара в ProductFileManager.update_file:
+    FileSystemStorage перемещает файл по temporary_file_path без копирования
+    """
+
+    def __init__(self, name: str, temp_path: str, size: int, content_type: str | None):
+        super().__init__(file=None, name=name, content_type=content_type, size=size)
+        self.temp_path = temp_path
+
+    def temporary_file_path(self) -> str:
+        return self.temp_path
+
+    def open(self, mode=None):
+        raise ValueError("Stored product file should be moved through the storage")
+
+    def close(self):
+        pass
+
+
+class ProductFileUploadHandler(FileUploadHandler):
+    """
+    Потоковая загрузка файла товара в поле FIELD_NAME.
+    Расширение и размер проверяются по мере получения данных: загрузка прерывается до чтения тела запроса,
+    если Content-Length заведомо больше лимита, и на первом байте сверх ProductFileManager.MAX_FILE_SIZE_BYTES.
+    Данные пишутся во временный файл в хранилище рядом с итоговым. Под итоговое имя <id>__<имя> файл переносится хранилищем
+    только после проверок в ProductFileManager.update_file, поэтому текущий файл товара не заменяется до успешного обновления.
+    Временный файл удаляется в cleanup, который нужно вызвать после обработки запроса.
+    Должен быть установлен в request.upload_handlers до обращения к request.data / request.FILES
+    """
+    FIELD_NAME = "file"
+    MULTIPART_OVERHEAD_BYTES = 64 * 1024
+    """
+    Допустимый размер заголовков multipart и остальных полей запроса
+    """
+
+    product: Product
+
+    def __init__(self, request, product: Product):
+        super().__init__(request)
+        self.product = product
+        self.storage = product.file.storage
+        self.__handled = False
+        self.__received = 0
+        self.__temp_name: str | None = None
+        self.__temp_fd: int | None = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > ProductFileManager.MAX_FILE_SIZE_BYTES + self.MULTIPART_OVERHEAD_BYTES:
+            raise ProductFileManager.FileTooLargeError()
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        # принимается только один файл в поле FIELD_NAME
+        if field_name != self.FIELD_NAME or self.__handled:
+            raise SkipFile()
+
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+
+        path, ext = os.path.splitext(file_name)
+        if ext not in ProductFileManager.ALLOWED_EXTENSIONS:
+            raise ProductFileManager.InvalidFileTypeError(ext)
+
+        if content_length is not None and content_length > ProductFileManager.MAX_FILE_SIZE_BYTES:
+            raise ProductFileManager.FileTooLargeError()
+
+        self.__handled = True
+        final_name = self.storage.generate_filename(ProductFileManager(self.product).get_filename_for_storage(file_name))
+        self.__temp_name = f"{final_name}.{uuid.uuid4().hex}.part"
+        temp_path = self.storage.path(self.__temp_name)
+        os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+
+        # права как у FileSystemStorage: 0o666 с учетом umask, file_permissions_mode применяет хранилище при переносе
+        self.__temp_fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.__temp_fd is None:
+            return raw_data
+
+        self.__received += len(raw_data)
+        if self.__received > ProductFileManager.MAX_FILE_SIZE_BYTES:
+            self.cleanup()
+            raise ProductFileManager.FileTooLargeError()
+
+        os.write(self.__temp_fd, raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.__temp_fd is None:
+            return None
+
+        os.close(self.__temp_fd)
+        self.__temp_fd = None
+        return StoredProductFile(self.file_name, self.storage.path(self.__temp_name), file_size, self.content_type)
+
+    def upload_interrupted(self):
+        self.cleanup()
+
+    def cleanup(self):
+        """
+        Удаляет временный файл, если он не был перенесен под итоговое имя. Вызывается после обработки запроса и при ошибке загрузки
+        """
+        if self.__temp_fd is not None:
+            os.close(self.__temp_fd)
+            self.__temp_fd = None
+        if self.__temp_name is not None:
+            self.storage.delete(self.__temp_name)
+            self.__temp_name = None
@@ -3,11 +3,17 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.renderers import BaseRenderer
 from utils.exceptions import APIException
+from utils.pagination import KeysetPagination
+from utils.transactions import RetriesExhaustedError
+from utils.file_responses import serve_file
+from idempotency.decorators import idempotent
 from .models import Category, Product
-from .serializers import CategorySerializer, ProductSerializer
-from .services import ProductBuyer, ProductFileManager, ProductAccessManager, ProductDeleter, ProductSupportService
+from .serializers import (CategorySerializer, ProductSerializer, CartCheckoutSerializer, CartItemResultSerializer,
+                          ProductImportSerializer, ProductImportResultSerializer)
+from .upload_handlers import ProductFileUploadHandler
+from .services import (ProductBuyer, ProductCartBuyer, ProductReserver, ProductFileManager, ProductAccessManager, ProductDeleter,
+                       ProductSupportService, ProductCreator, ProductBulkCreator)
 from django_filters.rest_framework import DjangoFilterBackend, FilterSet, NumberFilter, CharFilter
-from django.http.response import FileResponse
 import os.path
 
 
@@ -23,13 +29,21 @@ class ProductFilterSet(FilterSet):
     support_code = CharFilter(method='filter_support_code')
 
     def filter_support_code(self, queryset, name, value):
-        return ProductSupportService.query_by_support_code(value)
+        # query_by_support_code возвращает срез, который нельзя фильтровать и сортировать при пагинации,
+        # поэтому используется как подзапрос
+        return Product.objects.filter(pk__in=ProductSupportService.query_by_support_code(value).values("pk"))
 
     class Meta:
         model = Product
         fields = ("category", "support_code")
 
 
+class ProductPagination(KeysetPagination):
+    ordering = ("added_at", "id")
+    page_size = 20
+    max_page_size = 100
+
+
 class PassthroughRenderer(BaseRenderer):
     """
         Return data as-is. View should supply a Response.
@@ -64,14 +78,19 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet, mixins.CreateModelMixin, mix
     serializer_class = ProductSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = ProductFilterSet
+    pagination_class = ProductPagination
 
     # Product.objects.all() для метода DELETE
     def get_queryset(self):
         if self.action == "destroy":
             return Product.objects.all()
+        # зарезервированные товары скрыты из Product.available, но должны быть доступны для покупки и резерва
+        if self.action in ("buy", "reserve"):
+            return Product.objects.filter(purchased_by=None)
         return super().get_queryset()
 
     @action(detail=True, methods=['post'])
+    @idempotent(transient_codes=("concurrent_purchase", "no_support_codes"))
     def buy(self, request, pk=None):
         product = self.get_object()
 
@@ -86,9 +105,89 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet, mixins.CreateModelMixin, mix
             raise APIException("You can't buy the product you are selling", code="buying_by_seller", status=status.HTTP_409_CONFLICT)
         except ProductBuyer.NoFileError:
             raise APIException(detail="File for this product hasn't been added yet or has already been deleted", code="no_file", status=status.HTTP_409_CONFLICT)
+        except ProductBuyer.ReservedError:
+            raise APIException(detail="Product is reserved by another customer", code="reserved", status=status.HTTP_409_CONFLICT)
+        except ProductBuyer.NotReservedError:
+            raise APIException(detail="Reserve the product before buying", code="not_reserved", status=status.HTTP_409_CONFLICT)
+        except RetriesExhaustedError:
+            raise APIException(detail="Too many concurrent purchases. Please, try again.", code="concurrent_purchase", status=status.HTTP_409_CONFLICT)
+        except ProductSupportService.CodeGenerationError:
+            raise APIException(detail="No free support codes. Please, try again later.", code="no_support_codes", status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except Exception as e:
             raise APIException(detail=str(e), code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=True, methods=['post', 'delete'])
+    def reserve(self, request, pk=None):
+        """
+        POST - резервирует товар за пользователем на settings.PRODUCT_RESERVATION_TTL или продлевает резерв, DELETE - снимает резерв
+        """
+        reserver = ProductReserver(self.get_object(), request.user)
+
+        if request.method == "DELETE":
+            reserver.release()
+            return Response(data={}, status=status.HTTP_200_OK)
+
+        try:
+            reserved_until = reserver.reserve()
+        except ProductReserver.BuyingBySellerError:
+            raise APIException("You can't buy the product you are selling", code="buying_by_seller", status=status.HTTP_409_CONFLICT)
+        except ProductReserver.NotAvailableError:
+            raise APIException(detail="Product is already reserved or bought", code="not_available", status=status.HTTP_409_CONFLICT)
+        except ProductReserver.TooManyReservationsError:
+            raise APIException(detail="Too many reserved products", code="too_many_reservations", status=status.HTTP_409_CONFLICT)
+
+        return Response(data={"reserved_until": reserved_until}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    @idempotent(transient_codes=("concurrent_purchase", "no_support_codes"))
+    def checkout(self, request):
+        """
+        Покупка нескольких товаров в одной транзакции. Возвращает результат по каждому товару
+        """
+        serializer = CartCheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            results = ProductCartBuyer(serializer.validated_data["products"], request.user.id).buy()
+        except RetriesExhaustedError:
+            raise APIException(detail="Too many concurrent purchases. Please, try again.", code="concurrent_purchase", status=status.HTTP_409_CONFLICT)
+        except ProductSupportService.CodeGenerationError:
+            raise APIException(detail="No free support codes. Please, try again later.", code="no_support_codes", status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response(data={"results": CartItemResultSerializer(results, many=True).data}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path="import")
+    def import_products(self, request):
+        """
+        Создание нескольких товаров из манифеста (CSV/JSON) и файлов одним запросом.
+        Строки с ошибками пропускаются, результат возвращается по каждой строке манифеста
+        """
+        serializer = ProductImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rows = serializer.get_rows()
+
+        try:
+            products, file_errors = ProductBulkCreator(request.user, [item for item, errors in rows if item]).create()
+        except ProductCreator.InvalidSellerError as e:
+            raise APIException(detail=str(e), code="not_seller", status=status.HTTP_403_FORBIDDEN)
+        except ProductBulkCreator.FilesTooLargeError:
+            raise APIException(detail="Total size of files is too large", code="files_too_large", status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        created = iter(products)
+        results = []
+        for index, (item, errors) in enumerate(rows, start=1):
+            if item is None:
+                results.append({"row": index, "product_id": None, "created": False, "file_stored": False, "errors": errors})
+                continue
+
+            product = next(created)
+            file_error = file_errors.get(product.id)
+            results.append({"row": index, "product_id": product.id, "created": True,
+                            "file_stored": item.file is not None and file_error is None,
+                            "errors": {"file": [file_error]} if file_error else None})
+
+        return Response(data={"results": ProductImportResultSerializer(results, many=True).data}, status=status.HTTP_200_OK)
+
     @action(detail=True,
             methods=['get'],
             queryset=Product.objects.all(),
@@ -99,15 +198,14 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet, mixins.CreateModelMixin, mix
         if not ProductFileManager(product).has_file():
             raise APIException(detail="File for this product hasn't been added yet or has already been deleted", code="no_file", status=status.HTTP_409_CONFLICT)
 
-        file_handle = product.file.open()
+        file_manager = ProductFileManager(product)
 
-        response = FileResponse(file_handle, content_type='whatever')
-        response['Content-Length'] = product.file.size
-
-        filename = ProductFileManager.get_original_filename(product.file.name)
-        response['Content-Disposition'] = 'attachment; filename="%s"' % filename
-
-        return response
+        # при включенной отдаче через прокси воркер только проверяет доступ (CanDownload) и условные заголовки
+        return serve_file(request, product.file,
+                          size=file_manager.get_file_size(),
+                          last_modified=file_manager.get_file_updated_at(),
+                          content_type=product.file_content_type or ProductFileManager.DEFAULT_CONTENT_TYPE,
+                          filename=ProductFileManager.get_original_filename(product.file.name))
 
     @action(detail=True,
             methods=['put'],
@@ -116,8 +214,12 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet, mixins.CreateModelMixin, mix
     def upload(self, request, pk=None):
         product: Product = self.get_object()
 
-        file = request.FILES.get('file')
+        # тело запроса еще не прочитано: файл проверяется и записывается в хранилище по мере получения
+        upload_handler = ProductFileUploadHandler(request._request, product)
+        request._request.upload_handlers = [upload_handler]
+
         try:
+            file = request.FILES.get('file')
             ProductFileManager(product).update_file(file, commit=True, bypass_validation=False, allow_delete=ProductAccessManager(product, request.user).can_delete_file())
             return Response(data={}, status=status.HTTP_202_ACCEPTED)
         except ProductFileManager.InvalidFileTypeError as e:
@@ -126,6 +228,8 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet, mixins.CreateModelMixin, mix
             raise APIException(detail=str(e), code="file_too_large", status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
         except ProductFileManager.DeleteNotAllowedError as e:
             raise APIException(detail=str(e), code="delete_not_allowed", status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            upload_handler.cleanup()
 
     def perform_create(self, serializer):
         serializer.save(seller=self.request.user)
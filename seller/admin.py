@@ -1,8 +1,20 @@
 from django.contrib import admin
-from .models import Seller
+from .models import Seller, SalesRollup
 
 
 @admin.register(Seller)
 class SellerAdmin(admin.ModelAdmin):
-    pass
+    readonly_fields = ("on_sale_total", "on_sale_count")
 
+
+@admin.register(SalesRollup)
+class SalesRollupAdmin(admin.ModelAdmin):
+    list_display = ("seller", "category", "granularity", "period_start", "sales_count", "gross", "earned")
+    list_filter = ("granularity",)
+    date_hierarchy = "period_start"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+from django.core.management.base import BaseCommand, CommandError
+from seller.services import SalesRollupService
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает почасовую и посуточную статистику продаж селлеров по таблице товаров"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Пересчитать периоды, начиная с даты YYYY-MM-DD (UTC). По умолчанию - все")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = datetime.strptime(options["since"], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+            except ValueError:
+                raise CommandError("--since must be in format YYYY-MM-DD")
+
+        self.stdout.write("Rebuilding sales rollups...")
+        created = SalesRollupService.rebuild(since)
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt sales rollups: {created} rows'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from seller.services import SellerStatsService
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает сумму и количество товаров на продаже у всех селлеров"
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding seller stats...")
+        updated = SellerStatsService.recount()
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt stats of {updated} sellers'))
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:14
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def count_on_sale_products(apps, schema_editor):
+    Seller = apps.get_model('seller', 'Seller')
+    Product = apps.get_model('products', 'Product')
+
+    on_sale = Product.objects.filter(seller=OuterRef('pk'), purchased_by__isnull=True).order_by().values('seller')
+    Seller.objects.update(
+        on_sale_count=Coalesce(Subquery(on_sale.annotate(count=Count('id')).values('count')), 0),
+        on_sale_total=Coalesce(Subquery(on_sale.annotate(total=Sum('price')).values('total')), Value(Decimal(0))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seller', '0001_initial'),
+        ('products', '0020_purchases_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seller',
+            name='on_sale_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='On sale count'),
+        ),
+        migrations.AddField(
+            model_name='seller',
+            name='on_sale_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='On sale total'),
+        ),
+        migrations.RunPython(count_on_sale_products, migrations.RunPython.noop),
+    ]
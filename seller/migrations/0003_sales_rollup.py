@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0020_purchases_index'),
+        ('seller', '0002_seller_on_sale_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=8)),
+                ('period_start', models.DateTimeField()),
+                ('sales_count', models.PositiveIntegerField(default=0, verbose_name='Sales')),
+                ('gross', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Gross')),
+                ('earned', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Earned')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='products.category')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='seller.seller')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('seller', 'granularity', 'period_start', 'category'), name='sales_rollup_unique')],
+            },
+        ),
+    ]
@@ -16,9 +16,60 @@ class Seller(models.Model):
     """
     Сумма, которую сайт еще не выплатил селлеру
     """
+    on_sale_total = models.DecimalField("On sale total", max_digits=12, decimal_places=2, default=0, editable=False)
+    """
+    Сумма цен непроданных товаров. Поддерживается SellerStatsService, пересчитывается командой rebuild_seller_stats
+    """
+    on_sale_count = models.IntegerField("On sale count", default=0, editable=False)
+    """
+    Количество непроданных товаров. Поддерживается SellerStatsService, пересчитывается командой rebuild_seller_stats
+    """
 
     def __str__(self):
         return self.user.username
 
     def __repr__(self):
         return self.__str__()
+
+
+class SalesRollup(models.Model):
+    """
+    Продажи селлера в категории за период (час или день). Строки изменяются в транзакциях покупки (SalesRollupService),
+    поэтому статистика по периодам не требует чтения таблицы товаров. Восстанавливается командой rebuild_sales_rollups
+    """
+    GRANULARITY_HOUR = "hour"
+    GRANULARITY_DAY = "day"
+    GRANULARITY_CHOICES = [
+        (GRANULARITY_HOUR, "Hour"),
+        (GRANULARITY_DAY, "Day"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    seller = models.ForeignKey(Seller, on_delete=models.CASCADE, related_name='sales_rollups')
+    category = models.ForeignKey("products.Category", on_delete=models.CASCADE, related_name='sales_rollups')
+    granularity = models.CharField(max_length=8, choices=GRANULARITY_CHOICES)
+    period_start = models.DateTimeField()
+    """
+    Начало часа или дня в UTC
+    """
+    sales_count = models.PositiveIntegerField("Sales", default=0)
+    gross = models.DecimalField("Gross", max_digits=12, decimal_places=2, default=0)
+    """
+    Сумма цен проданных товаров
+    """
+    earned = models.DecimalField("Earned", max_digits=12, decimal_places=2, default=0)
+    """
+    Доход селлера с продаж (см. SellerEconomyService.get_earn)
+    """
+
+    class Meta:
+        constraints = [
+            # порядок полей также подходит для выборки временного ряда селлера
+            models.UniqueConstraint(fields=["seller", "granularity", "period_start", "category"], name="sales_rollup_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.seller_id} {self.granularity} {self.period_start:%Y-%m-%d %H:%M}"
+
+    def __repr__(self):
+        return self.__str__()
@@ -1,5 +1,8 @@
-from rest_framework.serializers import ModelSerializer, SerializerMethodField, CharField
-from .models import Seller
+from datetime import timedelta
+from rest_framework.serializers import (ModelSerializer, ListSerializer, Serializer, SerializerMethodField, CharField,
+                                        ChoiceField, DateTimeField, IntegerField, DecimalField, ValidationError)
+from django.utils import timezone
+from .models import Seller, SalesRollup
 from .services import SellerStatsService, SellerEconomyService
 from products.models import Product
 from django.urls import reverse
@@ -8,20 +11,35 @@ from products.services import ProductFileManager
 
 class SellerSerializer(ModelSerializer):
     on_sale = SerializerMethodField(read_only=True)
+    on_sale_count = SerializerMethodField(read_only=True)
     paid = SerializerMethodField(read_only=True)
 
     class Meta:
         model = Seller
-        fields = ("on_sale", "to_pay", "paid", "total_earned", "percent")
+        fields = ("on_sale", "on_sale_count", "to_pay", "paid", "total_earned", "percent")
         read_only_fields = ("total_earned", "to_pay", "percent")
 
     def get_on_sale(self, seller: Seller):
         return SellerStatsService(seller).get_total_on_sale()
 
+    def get_on_sale_count(self, seller: Seller):
+        return SellerStatsService(seller).get_count_on_sale()
+
     def get_paid(self, seller: Seller):
         return SellerStatsService(seller).get_already_paid()
 
 
+class SellerProductListSerializer(ListSerializer):
+    """
+    Разрешает URL скачивания один раз для всей страницы
+    """
+
+    def to_representation(self, data):
+        products = list(data.all() if hasattr(data, "all") else data)
+        self.child.download_urls = ProductFileManager.get_download_urls(products)
+        return super().to_representation(products)
+
+
 class SellerProductSerializer(ModelSerializer):
     file_name = SerializerMethodField(read_only=True)
     file_url = SerializerMethodField(read_only=True)
@@ -29,10 +47,14 @@ class SellerProductSerializer(ModelSerializer):
     price = SerializerMethodField(read_only=True)
     earn = SerializerMethodField(read_only=True)
 
+    download_urls: dict[int, str] | None = None
+
     def get_file_url(self, product: Product) -> str | None:
-        if ProductFileManager(product).has_file():
-            return reverse("product-download", kwargs={"pk": product.id})
-        return None
+        if not ProductFileManager(product).has_file():
+            return None
+        if self.download_urls is not None and product.id in self.download_urls:
+            return self.download_urls[product.id]
+        return reverse("product-download", kwargs={"pk": product.id})
 
     def get_earn(self, product: Product):
         return SellerEconomyService(self.context["seller"]).get_earn(product)
@@ -50,4 +72,48 @@ class SellerProductSerializer(ModelSerializer):
         model = Product
         fields = ("id", "file_name", "file_url", "category_name", "score", "price", "earn", "added_at", "purchased_at")
         read_only_fields = ("id", "file_name", "file_url", "category_name", "score", "price", "earn", "added_at", "purchased_at")
+        list_serializer_class = SellerProductListSerializer
+
+
+class TimeseriesQuerySerializer(Serializer):
+    """
+    Параметры запроса временного ряда продаж. По умолчанию возвращается последний DEFAULT_RANGES[granularity] период
+    """
+    DEFAULT_RANGES = {
+        SalesRollup.GRANULARITY_HOUR: timedelta(hours=48),
+        SalesRollup.GRANULARITY_DAY: timedelta(days=30),
+    }
+    MAX_RANGES = {
+        SalesRollup.GRANULARITY_HOUR: timedelta(days=31),
+        SalesRollup.GRANULARITY_DAY: timedelta(days=366),
+    }
+
+    granularity = ChoiceField(choices=SalesRollup.GRANULARITY_CHOICES, default=SalesRollup.GRANULARITY_DAY)
+    since = DateTimeField(required=False)
+    until = DateTimeField(required=False)
+    category_id = IntegerField(required=False)
+    seller_id = IntegerField(required=False)
+    """
+    Только для администраторов
+    """
+
+    def validate(self, attrs):
+        granularity = attrs["granularity"]
+        until = attrs.get("until") or timezone.now()
+        since = attrs.get("since") or until - self.DEFAULT_RANGES[granularity]
+
+        if since >= until:
+            raise ValidationError({"since": "Must be earlier than 'until'"})
+        if until - since > self.MAX_RANGES[granularity]:
+            raise ValidationError({"since": f"Range is too long for granularity '{granularity}'"})
+
+        attrs["since"] = since
+        attrs["until"] = until
+        return attrs
+
 
+class TimeseriesPointSerializer(Serializer):
+    period_start = DateTimeField()
+    sales_count = IntegerField()
+    gross = DecimalField(max_digits=12, decimal_places=2)
+    earned = DecimalField(max_digits=12, decimal_places=2)
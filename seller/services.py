@@ -1,9 +1,15 @@
-from .models import Seller
+from .models import Seller, SalesRollup
 from users.models import User
 from content.models import ContentModel
 from products.models import Product
-from django.db.models import Sum
+from decimal import Decimal
+from django.db.models import Sum, Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, TruncHour, TruncDay
 from django.db.utils import IntegrityError
+from django.db import transaction
+from datetime import datetime, timezone as dt_timezone
+from collections import defaultdict
+from typing import Iterable
 
 
 def get_or_create_seller(user: User):
@@ -28,6 +34,10 @@ class SellerCreator:
     def create(self):
         self.user.seller = Seller()
         self.user.seller.percent = self.get_default_percent()
+        # товары могли быть добавлены до создания объекта Seller. Статистика считается до сохранения через ту же БД,
+        # что и Seller: при первой покупке объект создается в незафиксированной Serializeable транзакции
+        self.user.seller.on_sale_count, self.user.seller.on_sale_total = \
+            SellerStatsService.count_on_sale(self.user.id, using=self.user.seller._state.db)
         self.user.seller.save()
         return self.user.seller
 
@@ -37,18 +47,72 @@ class SellerCreator:
 
 
 class SellerStatsService:
+    """
+    Статистика селлера. Сумма и количество товаров на продаже хранятся в Seller и изменяются в транзакциях,
+    которые добавляют, продают и удаляют товары, поэтому панель селлера не агрегирует его товары.
+    Возможный рассинхрон исправляется командой rebuild_seller_stats
+    """
     seller: Seller
 
     def __init__(self, seller: Seller):
         self.seller = seller
 
     def get_total_on_sale(self):
-        # "or 0" нужен, т. к. если нет товаров на продаже, то .aggregate(Sum('price'))["price__sum"] вернет None
-        return float(Product.objects.filter(seller_id=self.seller.user_id, purchased_by__isnull=True).aggregate(Sum('price'))["price__sum"] or 0)
+        return float(self.seller.on_sale_total)
+
+    def get_count_on_sale(self) -> int:
+        return self.seller.on_sale_count
 
     def get_already_paid(self):
         return float(self.seller.total_earned - self.seller.to_pay)
 
+    def on_product_purchased(self, product: Product):
+        """
+        Изменяет статистику загруженного объекта Seller. Используется в транзакциях покупки, которые сами сохраняют Seller
+        """
+        self.seller.on_sale_total -= product.price
+        self.seller.on_sale_count -= 1
+
+    @staticmethod
+    def adjust_on_sale(seller_id: str, count_delta: int, total_delta, using: str = "default"):
+        """
+        Атомарно изменяет статистику селлера в текущей транзакции БД using.
+        Если объекта Seller еще нет, ничего не делает: статистика будет посчитана при создании объекта (SellerCreator)
+        """
+        if not count_delta and not total_delta:
+            return
+
+        (Seller.objects.using(using)
+         .filter(user_id=seller_id)
+         .update(on_sale_count=F("on_sale_count") + count_delta, on_sale_total=F("on_sale_total") + total_delta))
+
+    @staticmethod
+    def count_on_sale(seller_id: str, using: str = "default") -> tuple[int, Decimal]:
+        """
+        :return: Количество и сумма товаров селлера на продаже по таблице товаров
+        """
+        stats = (Product.objects.using(using)
+                 .filter(seller_id=seller_id, purchased_by__isnull=True)
+                 .aggregate(count=Count("id"), total=Sum("price")))
+        return stats["count"], stats["total"] or Decimal(0)
+
+    @staticmethod
+    def recount(seller_ids: Iterable[str] | None = None) -> int:
+        """
+        Пересчитывает статистику по таблице товаров.
+        :param seller_ids: ID селлеров для пересчета; None - все селлеры
+        """
+        on_sale = Product.objects.filter(seller=OuterRef("pk"), purchased_by__isnull=True).order_by().values("seller")
+        on_sale_count = on_sale.annotate(count=Count("id")).values("count")
+        on_sale_total = on_sale.annotate(total=Sum("price")).values("total")
+
+        sellers = Seller.objects.all()
+        if seller_ids is not None:
+            sellers = sellers.filter(user_id__in=list(seller_ids))
+
+        return sellers.update(on_sale_count=Coalesce(Subquery(on_sale_count), 0),
+                              on_sale_total=Coalesce(Subquery(on_sale_total), Value(Decimal(0))))
+
 
 class SellerEconomyService:
     seller: Seller
@@ -67,3 +131,101 @@ class SellerEconomyService:
         if commit:
             self.seller.save()
 
+
+class SalesRollupService:
+    """
+    Почасовая и посуточная статистика продаж селлеров по категориям (SalesRollup).
+    record() вызывается в транзакции покупки и увеличивает строки периодов атомарным UPDATE.
+    Если строки периода еще нет, она создается; при одновременном создании Serializeable транзакция
+    получает конфликт сериализации и повторяется (см. retry_on_serialization_failure)
+    """
+    EARN_QUANTUM = Decimal("0.01")
+
+    TRUNC_FUNCTIONS = {
+        SalesRollup.GRANULARITY_HOUR: TruncHour,
+        SalesRollup.GRANULARITY_DAY: TruncDay,
+    }
+
+    @staticmethod
+    def get_period_start(moment: datetime, granularity: str) -> datetime:
+        moment = moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+        if granularity == SalesRollup.GRANULARITY_DAY:
+            moment = moment.replace(hour=0)
+        return moment
+
+    @classmethod
+    def get_earn(cls, product: Product, seller: Seller) -> Decimal:
+        return Decimal(SellerEconomyService(seller).get_earn(product)).quantize(cls.EARN_QUANTUM)
+
+    @classmethod
+    def record(cls, sales: Iterable[tuple[Product, Seller]], using: str = "default"):
+        """
+        Добавляет проданные товары в статистику. У товаров должен быть заполнен purchased_at
+        :param sales: (товар, селлер товара)
+        """
+        # (селлер, категория, гранулярность, начало периода): [количество, сумма, доход]
+        totals = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+        for product, seller in sales:
+            earned = cls.get_earn(product, seller)
+            for granularity in cls.TRUNC_FUNCTIONS:
+                key = (seller.user_id, product.category_id, granularity, cls.get_period_start(product.purchased_at, granularity))
+                totals[key][0] += 1
+                totals[key][1] += Decimal(product.price)
+                totals[key][2] += earned
+
+        for (seller_id, category_id, granularity, period_start), (count, gross, earned) in totals.items():
+            updated = (SalesRollup.objects.using(using)
+                       .filter(seller_id=seller_id, category_id=category_id, granularity=granularity, period_start=period_start)
+                       .update(sales_count=F("sales_count") + count, gross=F("gross") + gross, earned=F("earned") + earned))
+            if not updated:
+                SalesRollup.objects.using(using).create(seller_id=seller_id, category_id=category_id, granularity=granularity,
+                                                        period_start=period_start, sales_count=count, gross=gross, earned=earned)
+
+    @classmethod
+    def rebuild(cls, since: datetime | None = None) -> int:
+        """
+        Пересчитывает статистику по таблице товаров. Доход считается по текущему проценту селлера.
+        :param since: Пересчитать периоды, начиная с суток, содержащих since; None - все периоды
+        :return: Количество созданных строк
+        """
+        products = Product.objects.filter(purchased_at__isnull=False, seller__seller__isnull=False)
+        rollups = SalesRollup.objects.all()
+        if since is not None:
+            since = cls.get_period_start(since, SalesRollup.GRANULARITY_DAY)
+            products = products.filter(purchased_at__gte=since)
+            rollups = rollups.filter(period_start__gte=since)
+
+        percents = dict(Seller.objects.values_list("user_id", "percent"))
+        created = 0
+        with transaction.atomic():
+            rollups.delete()
+            for granularity, trunc in cls.TRUNC_FUNCTIONS.items():
+                groups = (products.order_by()
+                          .annotate(period_start=trunc("purchased_at", tzinfo=dt_timezone.utc))
+                          .values("seller_id", "category_id", "period_start")
+                          .annotate(sales_count=Count("id"), gross=Sum("price")))
+
+                batch = []
+                for group in groups.iterator(chunk_size=2000):
+                    percent = Decimal(percents[group["seller_id"]])
+                    earned = (group["gross"] * (100 - percent) / 100).quantize(cls.EARN_QUANTUM)
+                    batch.append(SalesRollup(granularity=granularity, earned=earned, **group))
+                SalesRollup.objects.bulk_create(batch, batch_size=1000)
+                created += len(batch)
+
+        return created
+
+    @staticmethod
+    def get_timeseries(seller_id: int, granularity: str, since: datetime, until: datetime, category_id: int | None = None):
+        """
+        Временной ряд продаж селлера. Периоды без продаж не возвращаются
+        :return: Словари period_start, sales_count, gross, earned в порядке period_start
+        """
+        rollups = SalesRollup.objects.filter(seller_id=seller_id, granularity=granularity,
+                                             period_start__gte=since, period_start__lt=until)
+        if category_id is not None:
+            rollups = rollups.filter(category_id=category_id)
+
+        return list(rollups.order_by("period_start")
+                    .values("period_start")
+                    .annotate(sales_count=Sum("sales_count"), gross=Sum("gross"), earned=Sum("earned")))
@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import SellerView, SellerProductsView
+from .views import SellerView, SellerProductsView, SellerStatsTimeseriesView
 
 urlpatterns = [
     path('', SellerView.as_view(), name='seller'),
-    path('products/', SellerProductsView.as_view(), name='seller_products')
+    path('products/', SellerProductsView.as_view(), name='seller_products'),
+    path('stats/timeseries/', SellerStatsTimeseriesView.as_view(), name='seller_stats_timeseries'),
 ]
\ No newline at end of file
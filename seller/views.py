@@ -1,11 +1,14 @@
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
 from rest_framework import permissions
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
-from .services import get_or_create_seller
-from .serializers import SellerSerializer, SellerProductSerializer
+from .services import get_or_create_seller, SalesRollupService
+from .serializers import SellerSerializer, SellerProductSerializer, TimeseriesQuerySerializer, TimeseriesPointSerializer
 from products.models import Product
-from itertools import chain, islice
+from django.db.models import Q
+from django_filters.rest_framework import DjangoFilterBackend, FilterSet, NumberFilter
+from utils.pagination import SegmentedKeysetPagination
 
 
 class IsSeller(permissions.BasePermission):
@@ -22,9 +25,40 @@ class SellerView(APIView):
         return Response(serializer.data)
 
 
+class SellerProductFilterSet(FilterSet):
+    category_id = NumberFilter(field_name="category")
+
+    class Meta:
+        model = Product
+        fields = ("category_id",)
+
+
+class SellerProductPagination(SegmentedKeysetPagination):
+    """
+    Сначала товары на продаже (новые выше), затем проданные (недавно проданные выше).
+    Сегменты читаются по индексам (seller, purchased_by, -added_at) и (seller, purchased_by, -purchased_at)
+    """
+    segments = {
+        "on_sale": (Q(purchased_by__isnull=True), ("-added_at", "-id")),
+        # keyset пагинация не поддерживает NULL в полях сортировки
+        "sold": (Q(purchased_by__isnull=False, purchased_at__isnull=False), ("-purchased_at", "-id")),
+        # проданные товары без даты покупки (старые записи) выдаются после остальных проданных
+        "sold_undated": (Q(purchased_by__isnull=False, purchased_at__isnull=True), ("-id",)),
+    }
+    segment_query_param = "status"
+    segment_groups = {
+        "sold": ("sold", "sold_undated"),
+    }
+    page_size = 50
+    max_page_size = 200
+
+
 class SellerProductsView(ListAPIView):
     permission_classes = (permissions.IsAuthenticated, IsSeller,)
     serializer_class = SellerProductSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = SellerProductFilterSet
+    pagination_class = SellerProductPagination
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -32,23 +66,31 @@ class SellerProductsView(ListAPIView):
         return context
 
     def get_queryset(self):
-        category_id = self.request.query_params.get("category_id")
+        return Product.objects.filter(seller=self.request.user).select_related("category")
 
-        base_query = Product.objects.filter(seller=self.request.user)
 
-        on_sale_query = base_query.filter(purchased_by__isnull=True)
-        if category_id:
-            on_sale_query = on_sale_query.filter(category_id=category_id)
-        on_sale_query = on_sale_query.order_by("-added_at")
+class SellerStatsTimeseriesView(APIView):
+    """
+    Продажи селлера по часам или дням из SalesRollup.
+    Администраторы могут запросить статистику любого селлера параметром seller_id
+    """
+    permission_classes = (permissions.IsAuthenticated, IsSeller | permissions.IsAdminUser,)
 
-        sold_query = base_query.filter(purchased_by__isnull=False)
-        if category_id:
-            sold_query = sold_query.filter(category_id=category_id)
-        sold_query = sold_query.order_by("-purchased_at")
+    def get(self, request):
+        query = TimeseriesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
 
-        if self.request.query_params.get("status") == "on_sale":
-            return on_sale_query
-        if self.request.query_params.get("status") == "sold":
-            return sold_query.all()[:50]
+        seller_id = params.get("seller_id", request.user.id)
+        if seller_id != request.user.id and not request.user.is_staff:
+            raise PermissionDenied()
 
-        return islice(chain(on_sale_query.all(), sold_query.all()), 50)
+        points = SalesRollupService.get_timeseries(seller_id, params["granularity"],
+                                                   SalesRollupService.get_period_start(params["since"], params["granularity"]),
+                                                   params["until"], params.get("category_id"))
+        return Response({
+            "granularity": params["granularity"],
+            "since": params["since"],
+            "until": params["until"],
+            "results": TimeseriesPointSerializer(points, many=True).data,
+        })
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User
+from .models import User, BalanceEntry
+from .services import BalanceLedger
 
 
 class CustomUserAdmin(UserAdmin):
@@ -10,5 +11,28 @@ class CustomUserAdmin(UserAdmin):
     UserAdmin.fieldsets[2][1]["fields"] = (*UserAdmin.fieldsets[2][1]["fields"][:3], "is_seller",
                                            *UserAdmin.fieldsets[2][1]["fields"][3:])
     add_fieldsets = UserAdmin.add_fieldsets + ((None, {"fields": ["secret_phrase"]}),)
+    # баланс изменяется записями журнала (BalanceEntry)
+    readonly_fields = ("balance",)
+
+    @admin.display(description="Balance")
+    def balance(self, obj: User):
+        return BalanceLedger.get_balance(obj) if obj.pk else 0
 
 admin.site.register(User, CustomUserAdmin)
+
+
+@admin.register(BalanceEntry)
+class BalanceEntryAdmin(admin.ModelAdmin):
+    """
+    Записи журнала только добавляются: исправление баланса - новая запись с типом adjustment
+    """
+    list_display = ["id", "user", "amount", "kind", "reference", "created_at"]
+    list_filter = ["kind"]
+    search_fields = ["user__username", "reference"]
+    autocomplete_fields = ["user"]
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -1,11 +1,140 @@
+import binascii
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
 from knox.auth import TokenAuthentication
+from knox.crypto import hash_token
+from django.conf import settings
 from django.utils import timezone
 from rest_framework.exceptions import AuthenticationFailed
 from knox.models import get_token_model
 from django.contrib.auth.signals import user_logged_in
 from HorizonGlow.settings import REST_KNOX as custom_knox_settings
 from knox.settings import knox_settings
+from knox.signals import token_expired
 from django.http import HttpResponse
+from .models import User
+
+
+class TokenAuthCache:
+    """
+    Кэш проверенных токенов в памяти процесса: digest токена -> снимок токена и пользователя на settings.AUTH_TOKEN_CACHE_TTL.
+    Запрос с закэшированным токеном не обращается к БД. Для каждого запроса создаются новые объекты из снимка,
+    поэтому изменения request.user и кэш связанных объектов не переходят между запросами.
+    Записи удаляются при выходе (LogoutView) и изменении учетных данных в процессе, который обработал запрос;
+    в остальных процессах устаревшая запись живет не дольше TTL
+    """
+    MAX_SIZE = 10000
+
+    @dataclass
+    class Entry:
+        user_values: tuple
+        token_values: tuple
+        user_id: int
+        expiry: datetime | None
+        cached_at: float
+
+    __entries: OrderedDict[str, Entry] = OrderedDict()
+    __lock = threading.Lock()
+
+    @staticmethod
+    def get_ttl() -> float:
+        return settings.AUTH_TOKEN_CACHE_TTL.total_seconds()
+
+    @staticmethod
+    def __get_attnames(model) -> list[str]:
+        return [field.attname for field in model._meta.concrete_fields]
+
+    @classmethod
+    def get(cls, digest: str) -> tuple[User, object] | None:
+        """
+        :return: Новые объекты (пользователь, токен) или None, если токена нет в кэше или срок записи или токена истек
+        """
+        with cls.__lock:
+            entry = cls.__entries.get(digest)
+            if entry is None:
+                return None
+
+            if (time.monotonic() - entry.cached_at > cls.get_ttl()
+                    or (entry.expiry is not None and entry.expiry < timezone.now())):
+                del cls.__entries[digest]
+                return None
+
+        token_model = get_token_model()
+        user = User.from_db("default", cls.__get_attnames(User), entry.user_values)
+        auth_token = token_model.from_db("default", cls.__get_attnames(token_model), entry.token_values)
+        auth_token.user = user
+        return user, auth_token
+
+    @classmethod
+    def put(cls, user: User, auth_token):
+        if cls.get_ttl() <= 0:
+            return
+
+        entry = cls.Entry(user_values=tuple(getattr(user, name) for name in cls.__get_attnames(User)),
+                          token_values=tuple(getattr(auth_token, name) for name in cls.__get_attnames(type(auth_token))),
+                          user_id=user.id,
+                          expiry=auth_token.expiry,
+                          cached_at=time.monotonic())
+        with cls.__lock:
+            cls.__entries[auth_token.digest] = entry
+            cls.__entries.move_to_end(auth_token.digest)
+            while len(cls.__entries) > cls.MAX_SIZE:
+                cls.__entries.popitem(last=False)
+
+    @classmethod
+    def invalidate_token(cls, digest: str):
+        with cls.__lock:
+            cls.__entries.pop(digest, None)
+
+    @classmethod
+    def invalidate_user(cls, user_id: int):
+        with cls.__lock:
+            for digest in [digest for digest, entry in cls.__entries.items() if entry.user_id == user_id]:
+                del cls.__entries[digest]
+
+    @classmethod
+    def clear(cls):
+        with cls.__lock:
+            cls.__entries.clear()
+
+
+class TokenExpiryBuffer:
+    """
+    Продление токенов (knox AUTO_REFRESH) без записи в БД на каждый запрос: новые сроки накапливаются в памяти процесса
+    и записываются одним UPDATE не чаще knox MIN_REFRESH_INTERVAL.
+    Несохраненные при остановке процесса продления теряются, токен при этом истекает раньше, но не позже исходного срока
+    """
+    __pending: dict[str, datetime] = {}
+    __last_flush = time.monotonic()
+    __lock = threading.Lock()
+
+    @classmethod
+    def add(cls, digest: str, expiry: datetime):
+        with cls.__lock:
+            cls.__pending[digest] = expiry
+
+    @classmethod
+    def flush_if_due(cls):
+        with cls.__lock:
+            if not cls.__pending or time.monotonic() - cls.__last_flush < knox_settings.MIN_REFRESH_INTERVAL:
+                return
+        cls.flush()
+
+    @classmethod
+    def flush(cls) -> int:
+        with cls.__lock:
+            pending, cls.__pending = cls.__pending, {}
+            cls.__last_flush = time.monotonic()
+
+        if not pending:
+            return 0
+
+        token_model = get_token_model()
+        return token_model.objects.bulk_update([token_model(digest=digest, expiry=expiry) for digest, expiry in pending.items()],
+                                               ["expiry"], batch_size=500)
 
 
 class CookieTokenAuthentication(TokenAuthentication):
@@ -26,7 +155,39 @@ class CookieTokenAuthentication(TokenAuthentication):
         if self.get_cookie_auth_status():
             return self.authenticate_through_cookie(request)
 
-        super().authenticate(request)
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, token: bytes):
+        """
+        Проверенные токены берутся из TokenAuthCache, при промахе выполняется проверка knox (запрос к БД)
+        """
+        try:
+            digest = hash_token(token.decode("utf-8"))
+        except (TypeError, binascii.Error, UnicodeDecodeError):
+            raise AuthenticationFailed('Invalid token.')
+
+        cached = TokenAuthCache.get(digest)
+        if cached is not None:
+            user, auth_token = cached
+            if knox_settings.AUTO_REFRESH and auth_token.expiry:
+                self.renew_token(auth_token)
+        else:
+            user, auth_token = super().authenticate_credentials(token)
+            TokenAuthCache.put(user, auth_token)
+
+        TokenExpiryBuffer.flush_if_due()
+        return user, auth_token
+
+    def renew_token(self, auth_token) -> None:
+        """
+        Новый срок токена записывается в БД через TokenExpiryBuffer
+        """
+        new_expiry = timezone.now() + knox_settings.TOKEN_TTL
+        if knox_settings.AUTO_REFRESH_MAX_TTL is not None:
+            new_expiry = min(new_expiry, auth_token.created + knox_settings.AUTO_REFRESH_MAX_TTL)
+
+        auth_token.expiry = new_expiry
+        TokenExpiryBuffer.add(auth_token.digest, new_expiry)
 
     @staticmethod
     def get_cookie_auth_status():
@@ -40,11 +201,27 @@ class CookieTokenAuthentication(TokenAuthentication):
     def get_cookie_key():
         return custom_knox_settings.get("AUTH_COOKIE_KEY", "Token")
 
+    def _cleanup_token(self, auth_token) -> bool:
+        """
+        В отличие от knox проверяется только текущий токен, без перебора всех токенов пользователя:
+        истекшие токены удаляет задача purge_expired_auth_tokens
+        """
+        if auth_token.expiry is not None and auth_token.expiry < timezone.now():
+            username = auth_token.user.get_username()
+            auth_token.delete()
+            token_expired.send(sender=self.__class__, username=username, source="auth_token")
+            return True
+        return False
+
     @classmethod
     def create_token(cls, user):
-        return get_token_model().objects.create(
+        from .services import AuthTokenService
+
+        instance, token = get_token_model().objects.create(
             user=user, expiry=knox_settings.TOKEN_TTL, prefix=knox_settings.TOKEN_PREFIX
         )
+        AuthTokenService.enforce_limit(user)
+        return instance, token
 
     @classmethod
     def set_authentication_cookie(cls, response: HttpResponse, user):
@@ -54,5 +231,3 @@ class CookieTokenAuthentication(TokenAuthentication):
     @classmethod
     def remove_authentication_cookie(cls, response: HttpResponse):
         response.delete_cookie(cls.get_cookie_key())
-
-
@@ -0,0 +1,12 @@
+from utils.scheduler import periodic
+from .services import BalanceLedger, AuthTokenService
+
+
+@periodic("take_balance_snapshots", interval=300)
+def take_balance_snapshots():
+    BalanceLedger.take_snapshots()
+
+
+@periodic("purge_expired_auth_tokens", interval=3600)
+def purge_expired_auth_tokens():
+    AuthTokenService.purge_expired()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from users.services import AuthTokenService
+from utils.locks import advisory_lock
+
+
+class Command(BaseCommand):
+    help = "Удаляет истекшие токены авторизации пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=AuthTokenService.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        self.stdout.write("Purging expired auth tokens...")
+        # та же блокировка, что у задачи purge_expired_auth_tokens в планировщике
+        with advisory_lock("scheduler:purge_expired_auth_tokens") as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING("Purging is already running in another process"))
+                return
+            deleted = AuthTokenService.purge_expired(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Successfully purged {deleted} expired tokens"))
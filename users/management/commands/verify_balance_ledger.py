@@ -0,0 +1,82 @@
+import decimal
+import time
+from django.core.management.base import BaseCommand, CommandError
+from users.models import BalanceEntry, BalanceSnapshot, User
+from users.services import BalanceLedger
+
+
+class Command(BaseCommand):
+    help = ("Воспроизводит журнал баланса (BalanceEntry) по всем пользователям и проверяет снимки (BalanceSnapshot). "
+            "Записи читаются потоком в порядке (user_id, id), поэтому память не зависит от размера журнала")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument("--check-current", action="store_true",
+                            help="Дополнительно сравнить результат с BalanceLedger.get_balance для каждого пользователя")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        snapshots = {user_id: (balance, last_entry_id) for user_id, balance, last_entry_id in
+                     BalanceSnapshot.objects.order_by("user_id", "last_entry_id")
+                     .values_list("user_id", "balance", "last_entry_id")
+                     .iterator(chunk_size=options["chunk_size"])}
+
+        self.entries_count = 0
+        self.users_count = 0
+        self.errors = []
+        self.negative_balances = 0
+
+        current_user_id = None
+        balance = decimal.Decimal(0)
+        snapshot_checked = False
+        for user_id, entry_id, amount, kind in (BalanceEntry.objects
+                                                .order_by("user_id", "id")
+                                                .values_list("user_id", "id", "amount", "kind")
+                                                .iterator(chunk_size=options["chunk_size"])):
+            if user_id != current_user_id:
+                if current_user_id is not None:
+                    self.finish_user(current_user_id, balance, snapshots, snapshot_checked, options["check_current"])
+                current_user_id = user_id
+                balance = decimal.Decimal(0)
+                snapshot_checked = False
+
+            snapshot = snapshots.get(user_id)
+            if snapshot and not snapshot_checked and entry_id > snapshot[1]:
+                self.check_snapshot(user_id, balance, snapshot)
+                snapshot_checked = True
+
+            balance += amount
+            self.entries_count += 1
+            # покупка не должна уводить баланс в минус
+            if kind == BalanceEntry.KIND_PURCHASE and balance < 0:
+                self.negative_balances += 1
+                self.errors.append(f"User {user_id}: negative balance {balance} after entry {entry_id}")
+
+        if current_user_id is not None:
+            self.finish_user(current_user_id, balance, snapshots, snapshot_checked, options["check_current"])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Replayed {self.entries_count} entries of {self.users_count} users in {elapsed:.2f}s "
+                          f"({self.entries_count / max(elapsed, 1e-9):.0f} entries/s), "
+                          f"snapshots: {len(snapshots)}, negative balances: {self.negative_balances}")
+        for error in self.errors[:100]:
+            self.stderr.write(error)
+
+        if self.errors:
+            raise CommandError(f"Ledger verification failed: {len(self.errors)} errors")
+        self.stdout.write(self.style.SUCCESS("Ledger is consistent"))
+
+    def check_snapshot(self, user_id: int, balance: decimal.Decimal, snapshot: tuple[decimal.Decimal, int]):
+        if balance != snapshot[0]:
+            self.errors.append(f"User {user_id}: snapshot at entry {snapshot[1]} has balance {snapshot[0]}, replayed {balance}")
+
+    def finish_user(self, user_id: int, balance: decimal.Decimal, snapshots: dict, snapshot_checked: bool, check_current: bool):
+        self.users_count += 1
+        snapshot = snapshots.get(user_id)
+        if snapshot and not snapshot_checked:
+            self.check_snapshot(user_id, balance, snapshot)
+
+        if check_current:
+            current = BalanceLedger.get_balance(User(id=user_id))
+            if current != balance:
+                self.errors.append(f"User {user_id}: current balance {current}, replayed {balance}")
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_opening_entries(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    BalanceEntry = apps.get_model('users', 'BalanceEntry')
+    db = schema_editor.connection.alias
+
+    users = User.objects.using(db).exclude(balance=0).values_list('id', 'balance').iterator(chunk_size=2000)
+    BalanceEntry.objects.using(db).bulk_create(
+        (BalanceEntry(user_id=user_id, amount=balance, kind='opening') for user_id, balance in users),
+        batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_user_is_seller'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('kind', models.CharField(choices=[('opening', 'Opening balance'), ('topup', 'Top-up'), ('purchase', 'Purchase'), ('adjustment', 'Adjustment')], max_length=16)),
+                ('reference', models.CharField(blank=True, default='', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'balance entries',
+                'indexes': [models.Index(fields=['user', 'id'], name='users_balan_user_id_ca951f_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('last_entry_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_entry_id'], name='users_balan_user_id_1befaa_idx')],
+            },
+        ),
+        migrations.RunPython(create_opening_entries, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='user',
+            name='balance',
+        ),
+    ]
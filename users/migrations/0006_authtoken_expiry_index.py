@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    # CONCURRENTLY не блокирует запись в таблицу токенов (вход пользователей) на время построения индекса
+    concurrently = "CONCURRENTLY " if schema_editor.connection.vendor == "postgresql" else ""
+    schema_editor.execute(f"CREATE INDEX {concurrently}IF NOT EXISTS knox_authtoken_expiry_idx ON knox_authtoken (expiry)")
+
+
+def drop_index(apps, schema_editor):
+    concurrently = "CONCURRENTLY " if schema_editor.connection.vendor == "postgresql" else ""
+    schema_editor.execute(f"DROP INDEX {concurrently}IF EXISTS knox_authtoken_expiry_idx")
+
+
+class Migration(migrations.Migration):
+    """
+    Индекс по сроку действия токенов knox для пакетного удаления истекших токенов (AuthTokenService.purge_expired).
+    Модель принадлежит knox, поэтому индекс создается SQL-запросом.
+    CREATE INDEX CONCURRENTLY не выполняется в транзакции, поэтому миграция не атомарная
+    """
+    atomic = False
+
+    dependencies = [
+        ('users', '0005_balance_ledger'),
+        ('knox', '0009_extend_authtoken_field'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -7,5 +7,68 @@ class User(AbstractUser):
     REQUIRED_FIELDS = [*AbstractUser.REQUIRED_FIELDS, "secret_phrase"]
 
     secret_phrase = models.CharField("Secret phrase", max_length=128)
-    balance = models.DecimalField("Balance", max_digits=10, decimal_places=2, default=0)
-    is_seller = models.BooleanField("Seller status", default=False)
\ No newline at end of file
+    is_seller = models.BooleanField("Seller status", default=False)
+
+
+class BalanceEntry(models.Model):
+    """
+    Запись журнала баланса. Записи только добавляются, баланс пользователя - сумма его записей (см. BalanceLedger)
+    """
+    KIND_OPENING = "opening"
+    KIND_TOPUP = "topup"
+    KIND_PURCHASE = "purchase"
+    KIND_ADJUSTMENT = "adjustment"
+    KIND_CHOICES = [
+        (KIND_OPENING, "Opening balance"),
+        (KIND_TOPUP, "Top-up"),
+        (KIND_PURCHASE, "Purchase"),
+        (KIND_ADJUSTMENT, "Adjustment"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='balance_entries')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    """
+    Положительная - зачисление, отрицательная - списание
+    """
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    reference = models.CharField(max_length=64, blank=True, default='')
+    """
+    Объект, с которым связана операция, например product:12 или payment:5077120345
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "balance entries"
+        indexes = [
+            models.Index(fields=["user", "id"]),    # для расчета баланса после снимка и истории операций
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.amount}"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class BalanceSnapshot(models.Model):
+    """
+    Баланс пользователя с учетом всех записей журнала с id <= last_entry_id.
+    Текущий баланс - баланс последнего снимка плюс записи после него
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='balance_snapshots')
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    last_entry_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-last_entry_id"]),    # для выборки последнего снимка
+        ]
+
+    def __str__(self):
+        return f"Snapshot {self.balance} at {self.last_entry_id}"
+
+    def __repr__(self):
+        return self.__str__()
@@ -1,13 +1,14 @@
+from datetime import datetime
 from django.db.transaction import commit
 from rest_framework import serializers, status
 from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.urls import reverse
-from .models import User
+from .models import User, BalanceEntry
 from products.models import Product
 from products.services import ProductFileManager, ProductSupportService
-from users.services import UserCreator, UserCredentialsManager
+from users.services import UserCreator, UserCredentialsManager, BalanceLedger
 
 
 class AuthTokenSerializer(serializers.Serializer):
@@ -106,6 +107,7 @@ class UserCredentialsSerializer(serializers.Serializer):
 
 
 class AccountSerializer(serializers.ModelSerializer):
+    balance = serializers.SerializerMethodField()
     password_new = serializers.CharField(label="New password", write_only=True, validators=[validate_password])
     secret_phrase_new = serializers.CharField(label="Secret Phrase", write_only=True, validators=[_validate_secret_phrase])
 
@@ -114,6 +116,10 @@ class AccountSerializer(serializers.ModelSerializer):
         fields = ('username', 'balance', 'is_seller', 'password_new', 'secret_phrase', 'secret_phrase_new')
         write_only_fields = ('password', 'secret_phrase')
 
+    @staticmethod
+    def get_balance(instance: User) -> str:
+        return str(BalanceLedger.get_balance(instance))
+
     def validate(self, attrs):
         password = attrs.get("password")
         secret_phrase = attrs.get("secret_phrase")
@@ -134,23 +140,47 @@ class AccountSerializer(serializers.ModelSerializer):
         return instance
 
 
+class PurchaseListSerializer(serializers.ListSerializer):
+    """
+    Вычисляет данные, общие для всей страницы покупок, один раз: URL скачивания и границу периода поддержки
+    """
+
+    def to_representation(self, data):
+        products = list(data.all() if hasattr(data, "all") else data)
+        self.child.download_urls = ProductFileManager.get_download_urls(products)
+        self.child.support_period_start = ProductSupportService.get_support_period_start()
+        return super().to_representation(products)
+
+
 class PurchaseSerializer(serializers.ModelSerializer):
     file_available = serializers.SerializerMethodField()
     file_url = serializers.SerializerMethodField()
     support_period_expired = serializers.SerializerMethodField()
 
+    download_urls: dict[int, str] | None = None
+    support_period_start: datetime | None = None
+
     def get_file_available(self, obj: Product) -> bool:
         return ProductFileManager(obj).has_file()
 
     def get_file_url(self, obj: Product) -> str:
+        if self.download_urls is not None and obj.id in self.download_urls:
+            return self.download_urls[obj.id]
         return reverse("product-download", kwargs={"pk": obj.id})
 
     def get_support_period_expired(self, obj: Product) -> bool:
-        return ProductSupportService(obj).is_support_period_expired()
+        if self.support_period_start is None or obj.purchased_at is None:
+            return ProductSupportService(obj).is_support_period_expired()
+        return obj.purchased_at < self.support_period_start
 
     class Meta:
         model = Product
         fields = ('id', 'description', 'number', 'score', 'purchased_at', 'price', "file_available", "file_url", "support_code", "support_period_expired")
+        list_serializer_class = PurchaseListSerializer
 
 
-
+class BalanceEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BalanceEntry
+        fields = ('id', 'amount', 'kind', 'reference', 'created_at')
+        read_only_fields = fields
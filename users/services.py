@@ -1,4 +1,14 @@
-from .models import User
+import decimal
+from datetime import timedelta
+from typing import Iterable, List
+from django.db.models import F, Sum, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db import transaction
+from django.utils import timezone
+from .models import User, BalanceEntry, BalanceSnapshot
+from .auth import TokenAuthCache
+from django.conf import settings
+from knox.models import get_token_model
 
 
 class UserCredentialsManager:
@@ -54,6 +64,58 @@ class UserCredentialsManager:
 
         if commit:
             self.user.save()
+            # снимок пользователя в кэше токенов содержит старые учетные данные
+            TokenAuthCache.invalidate_user(self.user.id)
+
+
+class AuthTokenService:
+    """
+    Ограничение размера таблицы токенов knox: истекшие токены удаляются пачками периодической задачей
+    purge_expired_auth_tokens, количество токенов пользователя ограничено settings.AUTH_TOKEN_LIMIT_PER_USER
+    """
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def purge_expired(batch_size: int = BATCH_SIZE) -> int:
+        """
+        Удаляет истекшие токены пачками по batch_size, каждая пачка - отдельный короткий DELETE по первичному ключу.
+        Блокировку от одновременного запуска в нескольких репликах обеспечивает вызывающий код (см. utils.locks.advisory_lock)
+        :return: Количество удаленных токенов
+        """
+        token_model = get_token_model()
+        now = timezone.now()
+        deleted = 0
+        while True:
+            digests = list(token_model.objects.filter(expiry__lt=now).values_list("digest", flat=True)[:batch_size])
+            if not digests:
+                break
+
+            deleted += token_model.objects.filter(digest__in=digests).delete()[0]
+            for digest in digests:
+                TokenAuthCache.invalidate_token(digest)
+
+            if len(digests) < batch_size:
+                break
+        return deleted
+
+    @staticmethod
+    def enforce_limit(user: User, limit: int | None = None) -> int:
+        """
+        Удаляет самые старые токены пользователя сверх limit (по умолчанию settings.AUTH_TOKEN_LIMIT_PER_USER)
+        :return: Количество удаленных токенов
+        """
+        if limit is None:
+            limit = settings.AUTH_TOKEN_LIMIT_PER_USER
+
+        token_model = get_token_model()
+        digests = list(token_model.objects.filter(user=user).order_by("-created").values_list("digest", flat=True)[limit:])
+        if not digests:
+            return 0
+
+        deleted = token_model.objects.filter(digest__in=digests).delete()[0]
+        for digest in digests:
+            TokenAuthCache.invalidate_token(digest)
+        return deleted
 
 
 class UserCreator:
@@ -80,4 +142,113 @@ class UserCreator:
         return user
 
 
+class BalanceLedger:
+    """
+    Баланс пользователя как журнал операций (BalanceEntry) со снимками (BalanceSnapshot).
+    Операции только добавляются, строка пользователя не изменяется, поэтому операции не конфликтуют на ней.
+    Баланс - последний снимок плюс записи после него; снимки создаются периодически задачей take_balance_snapshots
+    для пользователей с новыми записями, поэтому "хвост" записей остается коротким.
+    Для проверки баланса перед списанием get_balance и debit должны выполняться в одной Serializeable транзакции
+    """
+    SNAPSHOT_CHUNK_SIZE = 1000
+    SNAPSHOT_LAG = timedelta(minutes=5)
+    """
+    В снимок попадают только записи старше SNAPSHOT_LAG. id записей выделяются до коммита транзакции,
+    поэтому запись с меньшим id может стать видимой позже записи с большим; задержка гарантирует,
+    что все записи с id <= last_entry_id снимка уже закоммичены
+    """
+
+    @staticmethod
+    def get_balance(user: User, using: str = "default") -> decimal.Decimal:
+        snapshot = (BalanceSnapshot.objects.using(using)
+                    .filter(user_id=user.id)
+                    .order_by("-last_entry_id")
+                    .values_list("balance", "last_entry_id")
+                    .first())
+        balance, last_entry_id = snapshot or (decimal.Decimal(0), 0)
+
+        tail = (BalanceEntry.objects.using(using)
+                .filter(user_id=user.id, id__gt=last_entry_id)
+                .aggregate(total=Sum("amount"))["total"])
+        return (balance + (tail or 0)).quantize(decimal.Decimal("0.01"))
+
+    @staticmethod
+    def add_entry(user: User, amount: decimal.Decimal, kind: str, reference: str = "", using: str = "default") -> BalanceEntry:
+        """
+        :param amount: Положительная - зачисление, отрицательная - списание
+        """
+        return BalanceEntry.objects.using(using).create(user_id=user.id, amount=amount, kind=kind, reference=reference)
+
+    @classmethod
+    def credit(cls, user: User, amount: decimal.Decimal, kind: str, reference: str = "", using: str = "default") -> BalanceEntry:
+        return cls.add_entry(user, amount, kind, reference, using)
+
+    @classmethod
+    def debit(cls, user: User, amount: decimal.Decimal, kind: str, reference: str = "", using: str = "default") -> BalanceEntry:
+        return cls.add_entry(user, -amount, kind, reference, using)
+
+    @staticmethod
+    def add_entries(entries: Iterable[BalanceEntry], using: str = "default") -> List[BalanceEntry]:
+        """
+        Добавляет несколько записей одним INSERT
+        """
+        return BalanceEntry.objects.using(using).bulk_create(entries)
 
+    @classmethod
+    def take_snapshots(cls, chunk_size: int = SNAPSHOT_CHUNK_SIZE) -> int:
+        """
+        Создает снимки для пользователей, у которых появились записи после предыдущего запуска.
+        Все снимки запуска имеют одинаковый last_entry_id, поэтому граница предыдущего запуска - last_entry_id последнего снимка.
+        Вызывается задачей take_balance_snapshots в одном процессе
+        :return: Количество созданных снимков
+        """
+        previous_cutoff = BalanceSnapshot.objects.order_by("-id").values_list("last_entry_id", flat=True).first() or 0
+        cutoff = (BalanceEntry.objects
+                  .filter(id__gt=previous_cutoff, created_at__lte=timezone.now() - cls.SNAPSHOT_LAG)
+                  .aggregate(last_id=Max("id"))["last_id"])
+        if cutoff is None:
+            return 0
+
+        user_ids = list(BalanceEntry.objects
+                        .filter(id__gt=previous_cutoff, id__lte=cutoff)
+                        .order_by("user_id").values_list("user_id", flat=True).distinct())
+
+        created = 0
+        for offset in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[offset:offset + chunk_size]
+            balances = cls.__get_balances(chunk, cutoff)
+            with transaction.atomic():
+                BalanceSnapshot.objects.bulk_create(
+                    BalanceSnapshot(user_id=user_id, balance=balance, last_entry_id=cutoff) for user_id, balance in balances.items()
+                )
+                # для расчета баланса нужен только последний снимок
+                BalanceSnapshot.objects.filter(user_id__in=chunk, last_entry_id__lt=cutoff).delete()
+            created += len(balances)
+        return created
+
+    @staticmethod
+    def __get_balances(user_ids: List[int], last_entry_id: int) -> dict[int, decimal.Decimal]:
+        """
+        :return: Балансы пользователей с учетом записей с id <= last_entry_id
+        """
+        snapshots = {}
+        for user_id, balance, snapshot_entry_id in (BalanceSnapshot.objects
+                                                    .filter(user_id__in=user_ids, last_entry_id__lte=last_entry_id)
+                                                    .order_by("user_id", "-last_entry_id")
+                                                    .values_list("user_id", "balance", "last_entry_id")):
+            snapshots.setdefault(user_id, (balance, snapshot_entry_id))
+
+        last_snapshot_entry_id = (BalanceSnapshot.objects
+                                  .filter(user_id=OuterRef("user_id"), last_entry_id__lte=last_entry_id)
+                                  .order_by("-last_entry_id")
+                                  .values("last_entry_id")[:1])
+        tails = dict(BalanceEntry.objects
+                     .filter(user_id__in=user_ids, id__lte=last_entry_id)
+                     .alias(snapshot_entry_id=Coalesce(Subquery(last_snapshot_entry_id), Value(0)))
+                     .filter(id__gt=F("snapshot_entry_id"))
+                     .order_by()
+                     .values("user_id")
+                     .annotate(total=Sum("amount"))
+                     .values_list("user_id", "total"))
+
+        return {user_id: snapshots.get(user_id, (decimal.Decimal(0), 0))[0] + tails.get(user_id, 0) for user_id in user_ids}
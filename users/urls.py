@@ -7,5 +7,6 @@ urlpatterns = [
      path(r'auth/login/', LoginView.as_view(), name='knox_login'),
      path(r'auth/logout/', LogoutView.as_view(), name='knox_logout'),
      path(r'account/', AccountView.as_view(), name='account'),
-     path(r'account/purchases/', PurchasesView.as_view(), name='purchases')
+     path(r'account/purchases/', PurchasesView.as_view(), name='purchases'),
+     path(r'account/transactions/', TransactionsView.as_view(), name='transactions'),
 ]
\ No newline at end of file
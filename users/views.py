@@ -7,10 +7,11 @@ from rest_framework.generics import ListAPIView
 from rest_framework.mixins import ListModelMixin
 from .serializers import AuthTokenSerializer, UserCredentialsSerializer, AccountSerializer
 from .models import User
-from .auth import CookieTokenAuthentication
+from .auth import CookieTokenAuthentication, TokenAuthCache
 from knox.views import LoginView as KnoxLoginView
 from rest_framework.settings import api_settings
-from .serializers import PurchaseSerializer
+from .serializers import PurchaseSerializer, BalanceEntrySerializer
+from utils.pagination import KeysetPagination
 
 
 class RegisterView(KnoxLoginView):
@@ -46,7 +47,10 @@ class LogoutView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
 
     def post(self, request, format=None):
+        # delete() обнуляет первичный ключ токена (digest)
+        digest = request._auth.digest
         request._auth.delete()
+        TokenAuthCache.invalidate_token(digest)
         response = Response(data={}, status=status.HTTP_204_NO_CONTENT)
         CookieTokenAuthentication.remove_authentication_cookie(response)
         return response
@@ -67,11 +71,38 @@ class AccountView(APIView):
 
 
 
+class PurchasePagination(KeysetPagination):
+    ordering = ("-purchased_at", "-id")
+    page_size = 50
+    max_page_size = 200
+
+
 class PurchasesView(ListAPIView):
+    """
+    Покупки пользователя, от новых к старым
+    """
     permission_classes = (permissions.IsAuthenticated,)
     serializer_class = PurchaseSerializer
+    pagination_class = PurchasePagination
 
     def get_queryset(self):
-        return self.request.user.purchased_products.order_by("-purchased_at").all()
+        # keyset пагинация не поддерживает NULL в полях сортировки
+        return self.request.user.purchased_products.filter(purchased_at__isnull=False)
+
+
+class TransactionPagination(KeysetPagination):
+    ordering = ("-id",)
+    page_size = 50
+    max_page_size = 200
 
 
+class TransactionsView(ListAPIView):
+    """
+    История операций с балансом, от новых к старым
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    serializer_class = BalanceEntrySerializer
+    pagination_class = TransactionPagination
+
+    def get_queryset(self):
+        return self.request.user.balance_entries.all()
@@ -0,0 +1,160 @@
+import hashlib
+import os.path
+import re
+from datetime import datetime
+from urllib.parse import quote
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+OFFLOAD_NGINX = "nginx"
+OFFLOAD_SENDFILE = "sendfile"
+
+
+def get_offload_mode() -> str:
+    """
+    :return: Способ отдачи файлов из settings.FILE_DOWNLOAD_OFFLOAD: "" - Django, "nginx" - X-Accel-Redirect, "sendfile" - X-Sendfile
+    """
+    return settings.FILE_DOWNLOAD_OFFLOAD
+
+
+def offloaded_file_response(file: FieldFile, content_type: str, filename: str) -> HttpResponse | None:
+    """
+    Создает пустой ответ с заголовком внутреннего перенаправления: файл отдает прокси, а воркер освобождается сразу.
+    Прокси должен отдавать файлы хранилища (MEDIA_ROOT) по FILE_DOWNLOAD_ACCEL_PREFIX только для внутренних перенаправлений
+    :return: None, если отдача через прокси отключена
+    """
+    mode = get_offload_mode()
+    if not mode:
+        return None
+
+    response = HttpResponse(content_type=content_type)
+    if mode == OFFLOAD_NGINX:
+        response["X-Accel-Redirect"] = settings.FILE_DOWNLOAD_ACCEL_PREFIX + quote(file.name)
+    elif mode == OFFLOAD_SENDFILE:
+        response["X-Sendfile"] = os.path.abspath(file.path)
+    else:
+        raise ValueError(f"Unsupported FILE_DOWNLOAD_OFFLOAD mode: {mode}")
+
+    response["Content-Disposition"] = 'attachment; filename="%s"' % filename
+    return response
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def make_etag(name: str, size: int, last_modified: datetime | None) -> str:
+    """
+    Сильный ETag из метаданных файла, без чтения содержимого
+    """
+    timestamp = last_modified.timestamp() if last_modified else 0
+    digest = hashlib.md5(f"{name}:{size}:{timestamp}".encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def serve_file(request, file: FieldFile, size: int, last_modified: datetime | None, content_type: str, filename: str) -> HttpResponseBase:
+    """
+    Отдает файл с поддержкой условных запросов (If-None-Match, If-Modified-Since -> 304) и одного диапазона Range (206/416).
+    Валидаторы строятся по переданным метаданным, поэтому ответ 304 не требует обращения к файлу.
+    При включенной отдаче через прокси (FILE_DOWNLOAD_OFFLOAD) диапазоны обрабатывает прокси
+    """
+    etag = make_etag(file.name, size, last_modified)
+    last_modified_timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    # заголовки-валидаторы, которые должны быть и в 304, и в полном ответе
+    validators = HttpResponse()
+    validators["ETag"] = etag
+    if last_modified_timestamp is not None:
+        validators["Last-Modified"] = http_date(last_modified_timestamp)
+    validators["Cache-Control"] = "private, no-cache"
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified_timestamp, response=validators)
+    if conditional is not validators:
+        return conditional
+
+    response = offloaded_file_response(file, content_type, filename)
+    if response is None:
+        response = __get_file_response(request, file, size, content_type, etag, last_modified_timestamp)
+
+    for header in ("ETag", "Last-Modified", "Cache-Control"):
+        if header in validators:
+            response[header] = validators[header]
+    response["Content-Disposition"] = 'attachment; filename="%s"' % filename
+    return response
+
+
+def __get_file_response(request, file: FieldFile, size: int, content_type: str, etag: str, last_modified: int | None) -> HttpResponseBase:
+    byte_range = __parse_range(request, size, etag, last_modified)
+
+    if byte_range is None:
+        response = FileResponse(file.open("rb"), content_type=content_type)
+        response["Content-Length"] = size
+    elif byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(__iter_range(file, start, end - start + 1), status=206, content_type=content_type)
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def __parse_range(request, size: int, etag: str, last_modified: int | None) -> tuple[int, int] | bool | None:
+    """
+    :return: (start, end) включительно; None - диапазон не запрошен или должен быть проигнорирован (отдается весь файл);
+    False - диапазон невыполним (416)
+    """
+    header = request.META.get("HTTP_RANGE")
+    if not header or request.method not in ("GET", "HEAD"):
+        return None
+
+    # If-Range: диапазон отдается, только если файл не изменился
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if if_range:
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            if etag not in parse_etags(if_range):
+                return None
+        elif last_modified is None or parse_http_date_safe(if_range) != last_modified:
+            return None
+
+    # несколько диапазонов и некорректные заголовки игнорируются, что допускается RFC 9110
+    match = RANGE_RE.match(header.strip())
+    if not match or (not match[1] and not match[2]):
+        return None
+
+    if not match[1]:
+        # bytes=-N - последние N байт
+        suffix = int(match[2])
+        if suffix == 0:
+            return False
+        return max(size - suffix, 0), size - 1
+
+    start = int(match[1])
+    end = int(match[2]) if match[2] else None
+    if end is not None and end < start:
+        return None
+    if start >= size:
+        return False
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+def __iter_range(file: FieldFile, start: int, length: int):
+    handle = file.open("rb")
+    try:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
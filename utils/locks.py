@@ -0,0 +1,36 @@
+import hashlib
+from contextlib import contextmanager
+from django.db import connections
+
+
+def get_advisory_lock_key(name: str) -> int:
+    """
+    :return: Ключ для pg_advisory_lock (signed bigint) из названия блокировки
+    """
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+@contextmanager
+def advisory_lock(name: str, using: str = "default"):
+    """
+    Сессионная advisory-блокировка PostgreSQL без ожидания.
+    Позволяет выполнять периодические задачи только в одной реплике: остальные получают False и пропускают запуск.
+    Для других СУБД блокировка не выполняется и всегда возвращается True
+    :return: True, если блокировка получена
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        yield True
+        return
+
+    key = get_advisory_lock_key(name)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [key])
+        acquired = cursor.fetchone()[0]
+
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
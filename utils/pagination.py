@@ -0,0 +1,222 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import Any, List
+from django.db.models import Q, QuerySet, Model
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor пагинация по набору полей ordering (keyset).
+    Позиция курсора - значения полей ordering у последнего элемента страницы, следующая страница выбирается условием
+    (f1, f2, ...) > (v1, v2, ...) с учетом направления сортировки, поэтому стоимость запроса не зависит от глубины.
+    Последнее поле ordering должно быть уникальным (обычно id), поля не должны содержать NULL.
+    Поддерживается только переход вперед (next)
+    """
+
+    ordering: tuple[str, ...] = ("-id",)
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self):
+        self.request = None
+        self.next_position = None
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None) -> List[Model]:
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+
+        # лишний элемент нужен только для определения наличия следующей страницы
+        items = list(queryset[:page_size + 1])
+        has_next = len(items) > page_size
+        items = items[:page_size]
+
+        self.next_position = self.get_position(items[-1]) if has_next else None
+        return items
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self) -> str | None:
+        if self.next_position is None:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_field_names(self) -> List[str]:
+        return [field.lstrip("-") for field in self.ordering]
+
+    def get_position(self, instance: Model) -> List[str]:
+        """
+        :return: Значения полей ordering у instance в строковом виде
+        """
+        return [instance._meta.get_field(name).value_to_string(instance) for name in self.get_field_names()]
+
+    def get_position_filter(self, position: List[Any]) -> Q:
+        """
+        Строит условие "строго после position" в порядке ordering: (f1 > v1) OR (f1 = v1 AND f2 > v2) OR ...
+        Дополнительное условие f1 >= v1 позволяет планировщику использовать индекс по первому полю как диапазон
+        """
+        lookups = [("lt" if field.startswith("-") else "gt", field.lstrip("-")) for field in self.ordering]
+
+        first_lookup, first_name = lookups[0]
+        result = Q()
+        for index, (lookup, name) in enumerate(lookups):
+            condition = Q(**{f"{name}__{lookup}": position[index]})
+            for prev_index in range(index):
+                condition &= Q(**{lookups[prev_index][1]: position[prev_index]})
+            result |= condition
+
+        return Q(**{f"{first_name}__{first_lookup}e": position[0]}) & result
+
+    def encode_cursor(self, position: List[str]) -> str:
+        return urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode("ascii")
+
+    def decode_cursor(self, request, model: type[Model]) -> List[Any] | None:
+        raw_position = self.decode_raw_cursor(request)
+        if raw_position is None:
+            return None
+        return self.parse_position(raw_position, model)
+
+    def decode_raw_cursor(self, request) -> List[Any] | None:
+        """
+        :return: Позиция из курсора без преобразования значений или None, если курсор не передан
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            raw_position = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(raw_position, list):
+            raise NotFound(self.invalid_cursor_message)
+        return raw_position
+
+    def parse_position(self, raw_position: List[Any], model: type[Model]) -> List[Any]:
+        """
+        Преобразует значения позиции к типам полей ordering
+        """
+        try:
+            names = self.get_field_names()
+            if len(raw_position) != len(names):
+                raise ValueError
+
+            return [model._meta.get_field(name).to_python(value) for name, value in zip(names, raw_position)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+
+class SegmentedKeysetPagination(KeysetPagination):
+    """
+    Keyset пагинация по последовательности сегментов: сначала выдаются все элементы первого сегмента, затем второго и т. д.
+    Сегмент - условие фильтрации и собственный ordering, поэтому каждый сегмент читается по своему индексу.
+    Курсор хранит название сегмента и позицию в нем. На границе сегментов страница дополняется из следующего сегмента,
+    поэтому запрос страницы выполняет не больше запросов к БД, чем сегментов
+    """
+
+    segments: dict[str, tuple[Q, tuple[str, ...]]] = {}
+    """
+    {название: (условие, ordering)} в порядке выдачи
+    """
+    segment_query_param: str | None = None
+    """
+    Параметр запроса, ограничивающий выдачу одним сегментом или группой сегментов
+    """
+    segment_groups: dict[str, tuple[str, ...]] = {}
+    """
+    {значение segment_query_param: (сегменты в порядке выдачи)}. Другие значения выбирают сегмент с таким названием
+    """
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None) -> List[Model]:
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        names = self.get_segment_names(request)
+        segment, position = self.decode_segment_cursor(request, queryset.model, names)
+
+        # (сегмент, элемент)
+        items = []
+        for name in names[names.index(segment):]:
+            condition, self.ordering = self.segments[name]
+            segment_queryset = queryset.filter(condition).order_by(*self.ordering)
+            if name == segment and position is not None:
+                segment_queryset = segment_queryset.filter(self.get_position_filter(position))
+
+            # лишний элемент нужен только для определения наличия следующей страницы
+            items.extend((name, item) for item in segment_queryset[:page_size + 1 - len(items)])
+            if len(items) > page_size:
+                break
+
+        has_next = len(items) > page_size
+        items = items[:page_size]
+
+        self.next_position = None
+        if has_next:
+            last_segment, last_item = items[-1]
+            self.ordering = self.segments[last_segment][1]
+            self.next_position = [last_segment] + self.get_position(last_item)
+        return [item for name, item in items]
+
+    def get_segment_names(self, request) -> List[str]:
+        names = list(self.segments)
+        if self.segment_query_param:
+            segment = request.query_params.get(self.segment_query_param)
+            if segment in self.segment_groups:
+                return list(self.segment_groups[segment])
+            if segment in self.segments:
+                return [segment]
+        return names
+
+    def decode_segment_cursor(self, request, model: type[Model], names: List[str]) -> tuple[str, List[Any] | None]:
+        """
+        :return: Сегмент и позиция в нем. Без курсора - первый сегмент и None
+        """
+        raw_position = self.decode_raw_cursor(request)
+        if raw_position is None:
+            return names[0], None
+
+        if not raw_position or raw_position[0] not in names:
+            raise NotFound(self.invalid_cursor_message)
+
+        segment = raw_position[0]
+        self.ordering = self.segments[segment][1]
+        return segment, self.parse_position(raw_position[1:], model)
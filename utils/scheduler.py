@@ -0,0 +1,107 @@
+import logging
+import signal
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Callable, List
+from django.conf import settings
+from django.db import close_old_connections
+from utils.locks import advisory_lock
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PeriodicJob:
+    name: str
+    func: Callable[[], object]
+    interval: float
+    """
+    Интервал между запусками в секундах. Может быть переопределен в settings.SCHEDULER_INTERVALS[name]
+    """
+    exclusive: bool = True
+    """
+    Выполнять задачу только в одной реплике одновременно (advisory lock с названием задачи)
+    """
+    next_run: float = field(default=0, compare=False)
+
+
+__jobs: dict[str, PeriodicJob] = {}
+
+
+def periodic(name: str, interval: float, exclusive: bool = True):
+    """
+    Регистрирует функцию как периодическую задачу. Задачи объявляются в модулях jobs.py приложений
+    и выполняются командой run_scheduler
+    """
+    def decorator(func):
+        __jobs[name] = PeriodicJob(name, func, interval, exclusive)
+        return func
+    return decorator
+
+
+def get_jobs() -> List[PeriodicJob]:
+    return list(__jobs.values())
+
+
+class Scheduler:
+    """
+    Выполняет периодические задачи в одном процессе. Задачи выполняются последовательно,
+    ошибка в задаче записывается в лог и не останавливает планировщик
+    """
+    jobs: List[PeriodicJob]
+
+    def __init__(self, jobs: List[PeriodicJob]):
+        self.jobs = jobs
+        self.__stopped = False
+
+        intervals = getattr(settings, "SCHEDULER_INTERVALS", {})
+        for job in self.jobs:
+            job.interval = intervals.get(job.name, job.interval)
+
+    def run_forever(self):
+        signal.signal(signal.SIGTERM, self.__stop)
+        signal.signal(signal.SIGINT, self.__stop)
+
+        logger.info("Scheduler started with jobs: %s", ", ".join(f"{job.name} ({job.interval}s)" for job in self.jobs))
+        while not self.__stopped:
+            now = time.monotonic()
+            for job in self.jobs:
+                if job.next_run <= now and not self.__stopped:
+                    self.run_job(job)
+                    job.next_run = time.monotonic() + job.interval
+
+            if self.jobs:
+                delay = min(job.next_run for job in self.jobs) - time.monotonic()
+            else:
+                delay = 60
+            self.__sleep(max(delay, 0))
+        logger.info("Scheduler stopped")
+
+    @staticmethod
+    def run_job(job: PeriodicJob):
+        # соединение могло быть закрыто БД за время ожидания
+        close_old_connections()
+        try:
+            if not job.exclusive:
+                job.func()
+                return
+
+            with advisory_lock(f"scheduler:{job.name}") as acquired:
+                if not acquired:
+                    logger.debug("Job %s is running in another process, skipping", job.name)
+                    return
+                job.func()
+        except Exception:
+            logger.error("Job %s failed:\n%s", job.name, traceback.format_exc())
+        finally:
+            close_old_connections()
+
+    def __sleep(self, seconds: float):
+        # сон короткими интервалами, чтобы быстро реагировать на остановку
+        deadline = time.monotonic() + seconds
+        while not self.__stopped and time.monotonic() < deadline:
+            time.sleep(min(1.0, deadline - time.monotonic()))
+
+    def __stop(self, signum, frame):
+        self.__stopped = True
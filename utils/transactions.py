@@ -0,0 +1,122 @@
+import functools
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, asdict
+from django.conf import settings
+from django.db import transaction, DatabaseError
+
+logger = logging.getLogger(__name__)
+
+SERIALIZATION_FAILURE_CODES = {
+    "40001",    # serialization_failure
+    "40P01",    # deadlock_detected
+}
+
+
+class RetriesExhaustedError(Exception):
+    """
+    Транзакция не выполнилась из-за конфликтов сериализации за допустимое количество попыток
+    """
+    pass
+
+
+def is_serialization_failure(error: BaseException) -> bool:
+    """
+    :return: True, если ошибка БД вызвана конфликтом транзакций и транзакцию можно повторить
+    """
+    while error is not None:
+        # pgcode - psycopg2, sqlstate - psycopg 3
+        code = getattr(error, "pgcode", None) or getattr(error, "sqlstate", None)
+        if code in SERIALIZATION_FAILURE_CODES:
+            return True
+        error = error.__cause__
+    return False
+
+
+@dataclass
+class RetryStats:
+    calls: int = 0
+    conflicts: int = 0
+    retries: int = 0
+    exhausted: int = 0
+
+
+class RetryMetrics:
+    """
+    Счетчики конфликтов и повторов по сервисам в пределах процесса.
+    Накопленные значения записываются в лог не чаще settings.RETRY_METRICS_LOG_INTERVAL при появлении новых конфликтов,
+    поэтому их видно по каждому воркеру (PID в формате лога); 0 - не записывать
+    """
+    __stats: dict[str, RetryStats] = {}
+    __lock = threading.Lock()
+    __logged_at = 0.0
+    __has_new_conflicts = False
+
+    @classmethod
+    def increment(cls, name: str, **counters: int):
+        with cls.__lock:
+            stats = cls.__stats.setdefault(name, RetryStats())
+            for counter, value in counters.items():
+                setattr(stats, counter, getattr(stats, counter) + value)
+            if counters.get("conflicts"):
+                cls.__has_new_conflicts = True
+        cls.log_if_due()
+
+    @classmethod
+    def get(cls) -> dict[str, dict]:
+        with cls.__lock:
+            return {name: asdict(stats) for name, stats in cls.__stats.items()}
+
+    @classmethod
+    def log_if_due(cls):
+        interval = settings.RETRY_METRICS_LOG_INTERVAL
+        with cls.__lock:
+            now = time.monotonic()
+            if not interval or not cls.__has_new_conflicts or now - cls.__logged_at < interval:
+                return
+            cls.__logged_at = now
+            cls.__has_new_conflicts = False
+        logger.info("Serialization retry metrics: %s", cls.get())
+
+
+def retry_on_serialization_failure(name: str,
+                                   using: str = "serializeable",
+                                   max_attempts: int = 5,
+                                   base_delay: float = 0.02,
+                                   max_delay: float = 0.5):
+    """
+    Декоратор для сервисов, которые открывают транзакцию в БД using (обычно Serializeable).
+    При конфликте сериализации вся функция выполняется заново с экспоненциальной задержкой и jitter,
+    после max_attempts попыток выбрасывается RetriesExhaustedError.
+    Функция должна открывать транзакцию сама: внутри внешней транзакции повтор невозможен, поэтому функция вызывается один раз
+    :param name: Название сервиса для метрик и логов
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if transaction.get_connection(using).in_atomic_block:
+                return func(*args, **kwargs)
+
+            RetryMetrics.increment(name, calls=1)
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except DatabaseError as e:
+                    if not is_serialization_failure(e):
+                        raise
+
+                    RetryMetrics.increment(name, conflicts=1)
+                    if attempt == max_attempts:
+                        RetryMetrics.increment(name, exhausted=1)
+                        logger.warning("%s: serialization failure, giving up after %s attempts", name, attempt)
+                        raise RetriesExhaustedError(f"{name} failed after {attempt} attempts") from e
+
+                    RetryMetrics.increment(name, retries=1)
+                    delay = min(base_delay * (2 ** (attempt - 1)), max_delay)
+                    logger.info("%s: serialization failure, retrying (attempt %s/%s)", name, attempt + 1, max_attempts)
+                    # full jitter, чтобы конфликтующие транзакции не повторялись синхронно
+                    time.sleep(random.uniform(0, delay))
+        return wrapper
+    return decorator